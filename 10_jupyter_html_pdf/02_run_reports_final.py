@@ -124,3 +124,19 @@ def run_reports(data, id_sets=None,
 
 # Test reporting.py version 2
 
+from my_pandas_extensions.reporting import run_reports
+
+# - The guard keeps worker processes (spawned on Windows and macOS)
+#   from re-running the reports when they import this script.
+
+if __name__ == "__main__":
+
+    run_reports(
+        data            = df,
+        id_sets         = id_sets,
+        report_titles   = titles,
+        directory       = "./09_jupyter_papermill/reports",
+        max_workers     = 4,
+        convert_to_html = True,
+        convert_to_pdf  = True
+    )
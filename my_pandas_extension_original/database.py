@@ -2,21 +2,141 @@
 
 # IMPORTS ----
 
+import pathlib
+import threading
+
 import sqlalchemy as sql
-from sqlalchemy.types import String, Numeric
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.types import String, Numeric, Integer, Float
 
+import numpy as np
 import pandas as pd
 
 import pandas_flavor as pf
 
+from my_pandas_extensions.timeseries import as_rollup_cube
+
+
+# ENGINES ----
+
+# One engine (and connection pool) per connection string, shared by 
+# every function in this module. See get_engine() and dispose_engines().
+ENGINE_CACHE = {}
+
+ENGINE_CACHE_LOCK = threading.Lock()
+
+def get_engine(conn_string, **kwargs):
+    """
+    Returns a pooled SQLAlchemy engine for a connection string, creating
+    it on first use and reusing it on later calls in the same process.
+
+    Connections are checked with a "pre-ping" before they are handed out,
+    so stale pooled connections are replaced transparently. File-based 
+    SQLite databases use a QueuePool so connections are kept open between 
+    calls.
+
+    Args:
+        conn_string (str): A SQLAlchemy connection string.
+        **kwargs: 
+            Additional arguments passed to sqlalchemy.create_engine() 
+            when the engine is first created.
+
+    Returns:
+        Engine: A SQLAlchemy engine.
+
+    See also:
+        - dispose_engines()
+    """
+
+    with ENGINE_CACHE_LOCK:
+
+        engine = ENGINE_CACHE.get(conn_string)
+
+        if engine is None:
+
+            engine_kwargs = {"pool_pre_ping": True}
+
+            url = sql.engine.make_url(conn_string)
+            is_sqlite_file = url.get_backend_name() == "sqlite" \
+                and url.database not in (None, "", ":memory:")
+
+            if is_sqlite_file:
+                engine_kwargs["poolclass"]    = QueuePool
+                engine_kwargs["connect_args"] = {"check_same_thread": False}
+
+            engine_kwargs.update(kwargs)
+
+            engine = sql.create_engine(conn_string, **engine_kwargs)
+
+            ENGINE_CACHE[conn_string] = engine
+
+    return engine
+
+def dispose_engines():
+    """
+    Closes the pooled connections of every cached engine and clears 
+    the engine cache. The next database call creates a fresh engine.
+
+    See also:
+        - get_engine()
+    """
+
+    with ENGINE_CACHE_LOCK:
+
+        for engine in ENGINE_CACHE.values():
+            engine.dispose()
+
+        ENGINE_CACHE.clear()
+
 
 # COLLECT DATA ----
-def collect_data(conn_string = "sqlite:///00_database/bike_orders_database.sqlite"):  
+
+# Single-query join used by collect_data(pushdown_join = True).
+# Only the columns needed to build the cleaned frame are returned.
+JOINED_ORDERLINES_QUERY = """
+    SELECT
+        o."order.id",
+        o."order.line",
+        o."order.date",
+        o.quantity,
+        b.price,
+        o.quantity * b.price AS "total.price",
+        b.model,
+        b.description,
+        s."bikeshop.name",
+        s.location
+    FROM orderlines AS o
+    LEFT JOIN bikes AS b
+        ON o."product.id" = b."bike.id"
+    LEFT JOIN bikeshops AS s
+        ON o."customer.id" = s."bikeshop.id"
+    {where_clause}
+    ORDER BY o."index"
+"""
+
+def collect_data(
+    conn_string = "sqlite:///00_database/bike_orders_database.sqlite",
+    pushdown_join = False,
+    since = None,
+    categorical = False
+):  
     """
     Collects and combines the bike orders data. 
 
     Args:
         conn_string (str, optional): A SQLAlchemy connection string to find the database. Defaults to "sqlite:///00_database/bike_orders_database.sqlite".
+        pushdown_join (bool, optional): 
+            If True, the orderlines, bikes and bikeshops tables are joined inside 
+            the database with a single query that only returns the needed columns 
+            and computes total.price in SQL. If False, each table is read in full
+            and merged with pandas. Defaults to False.
+        since (str or Timestamp, optional): 
+            If provided, only orderlines with an order.date on or after `since` 
+            are collected. Defaults to None (all orderlines).
+        categorical (bool, optional): 
+            If True, the columns parsed from description and location 
+            (category_1, category_2, frame_material, city, state) are returned 
+            with the pandas "category" dtype. Defaults to False.
 
     Returns:
         DataFrame: A pandas data frame that combines data from tables:
@@ -30,71 +150,225 @@ def collect_data(conn_string = "sqlite:///00_database/bike_orders_database.sqlit
 
     # 1.0 Connect to database
 
-    engine = sql.create_engine(conn_string)
+    engine = get_engine(conn_string)
 
     conn = engine.connect()
 
-    table_names = ['bikes', 'bikeshops', 'orderlines']
-
-    data_dict = {}
-    for table in table_names:
-        data_dict[table] = pd.read_sql(f"SELECT * FROM {table}", con=conn) \
-            .drop("index", axis=1)
-    
-    conn.close()
+    # Watermark filter on the orderlines table
+    params = {}
+    where_clause = ""
+    if since is not None:
+        params = {"since": pd.Timestamp(since).strftime("%Y-%m-%d %H:%M:%S")}
+        where_clause = 'WHERE o."order.date" >= :since'
 
     # 2.0 Combining Data
 
-    joined_df = pd.DataFrame(data_dict['orderlines']) \
-        .merge(
-            right    = data_dict['bikes'],
-            how      = 'left',
-            left_on  = 'product.id',
-            right_on = 'bike.id'
-        ) \
-        .merge(
-            right    = data_dict['bikeshops'],
-            how      = "left",
-            left_on  = "customer.id",
-            right_on = 'bikeshop.id'
+    if pushdown_join:
+
+        # Let the database do the join and the arithmetic
+        query = JOINED_ORDERLINES_QUERY.format(where_clause = where_clause)
+
+        joined_df = pd.read_sql(sql.text(query), con=conn, params=params)
+
+        conn.close()
+
+    else:
+
+        table_queries = {
+            'bikes'      : "SELECT * FROM bikes",
+            'bikeshops'  : "SELECT * FROM bikeshops",
+            'orderlines' : f"SELECT * FROM orderlines AS o {where_clause}"
+        }
+
+        data_dict = {}
+        for table, query in table_queries.items():
+            data_dict[table] = pd.read_sql(sql.text(query), con=conn, params=params) \
+                .drop("index", axis=1)
+        
+        conn.close()
+
+        joined_df = join_orderlines_data(
+            orderlines_df = data_dict['orderlines'],
+            bikes_df      = data_dict['bikes'],
+            bikeshops_df  = data_dict['bikeshops']
         )
 
     # 3.0 Cleaning Data 
 
-    df = joined_df
+    df = clean_orderlines_data(joined_df, categorical = categorical)
 
-    df['order.date'] = pd.to_datetime(df['order.date'])
+    # df.info()
 
-    temp_df = df['description'].str.split(" - ", expand = True)
-    df['category.1'] = temp_df[0]
-    df['category.2'] = temp_df[1]
-    df['frame.material'] = temp_df[2]
+    return df
 
-    temp_df = df['location'].str.split(", ", expand = True)
-    df['city'] = temp_df[0]
-    df['state'] = temp_df[1]
 
-    df['total.price'] = df['quantity'] * df['price']
+# CHUNKED COLLECT DATA ----
+def collect_data_chunks(
+    conn_string = "sqlite:///00_database/bike_orders_database.sqlite",
+    chunksize = 100000,
+    since = None,
+    categorical = False
+):
+    """
+    Collects and combines the bike orders data in chunks of orderlines,
+    keeping memory bounded by the chunk size.
 
-    df.columns
+    The small bikes and bikeshops tables are read once and kept in memory 
+    as lookup tables. Orderlines are streamed from the database and each 
+    chunk is joined and cleaned before it is yielded.
 
-    cols_to_keep_list = [
-        'order.id', 'order.line', 'order.date',    
-        'quantity', 'price', 'total.price', 
-        'model', 'category.1', 'category.2', 'frame.material', 
-        'bikeshop.name', 'city', 'state'
-    ]
+    Args:
+        conn_string (str, optional): 
+            A SQLAlchemy connection string to find the database. 
+            Defaults to "sqlite:///00_database/bike_orders_database.sqlite".
+        chunksize (int, optional): 
+            Number of orderlines per chunk. Defaults to 100000.
+        since (str or Timestamp, optional): 
+            Passed to collect_data(). Defaults to None.
+        categorical (bool, optional): 
+            Passed to collect_data(). Defaults to False.
 
-    df = df[cols_to_keep_list]
+    Yields:
+        DataFrame: Chunks of the data frame that collect_data() returns.
 
-    df.columns = df.columns.str.replace(".", "_",regex=False)
+    See also:
+        - collect_data()
+    """
 
-    # df.info()
+    # Checks
+    if type(chunksize) is not int or chunksize < 1:
+        raise ValueError("`chunksize` must be a positive integer.")
+
+    engine = get_engine(conn_string)
+
+    conn = engine.connect()
+
+    try:
+
+        # Lookup tables
+        bikes_df = pd.read_sql("SELECT * FROM bikes", con=conn) \
+            .drop("index", axis=1)
+
+        bikeshops_df = pd.read_sql("SELECT * FROM bikeshops", con=conn) \
+            .drop("index", axis=1)
+
+        # Watermark filter on the orderlines table
+        params = {}
+        where_clause = ""
+        if since is not None:
+            params = {"since": pd.Timestamp(since).strftime("%Y-%m-%d %H:%M:%S")}
+            where_clause = 'WHERE o."order.date" >= :since'
+
+        query = f'SELECT * FROM orderlines AS o {where_clause} ORDER BY o."index"'
+
+        chunks = pd.read_sql(
+            sql.text(query), 
+            con       = conn, 
+            params    = params,
+            chunksize = chunksize
+        )
+
+        for orderlines_df in chunks:
+
+            joined_df = join_orderlines_data(
+                orderlines_df = orderlines_df.drop("index", axis=1),
+                bikes_df      = bikes_df,
+                bikeshops_df  = bikeshops_df
+            )
+
+            yield clean_orderlines_data(joined_df, categorical = categorical)
+
+    finally:
+
+        conn.close()
+
+
+# INCREMENTAL COLLECT DATA ----
+def collect_data_incremental(
+    conn_string = "sqlite:///00_database/bike_orders_database.sqlite",
+    snapshot_path = "00_checkpoints/bike_orderlines_snapshot.pkl",
+    pushdown_join = False,
+    categorical = False
+):
+    """
+    Collects the bike orders data, only fetching orderlines that are newer 
+    than a local snapshot of previously collected data.
+
+    The latest order_date in the snapshot is used as the watermark. Orderlines 
+    from the watermark date onward are re-collected (so late-arriving rows for 
+    that date are picked up), cleaned, and appended to the older snapshot rows. 
+    The updated snapshot is saved back to `snapshot_path`.
+
+    Args:
+        conn_string (str, optional): 
+            A SQLAlchemy connection string to find the database. 
+            Defaults to "sqlite:///00_database/bike_orders_database.sqlite".
+        snapshot_path (str, optional): 
+            Path of the pickled snapshot of the cleaned data. If it does not 
+            exist, all the data is collected and the snapshot is created. 
+            Defaults to "00_checkpoints/bike_orderlines_snapshot.pkl".
+        pushdown_join (bool, optional): 
+            Passed to collect_data(). Defaults to False.
+        categorical (bool, optional): 
+            Passed to collect_data(). Defaults to False.
+
+    Returns:
+        DataFrame: The same data frame that collect_data() returns.
+
+    See also:
+        - collect_data()
+    """
+
+    snapshot_path = pathlib.Path(snapshot_path)
+
+    if snapshot_path.exists():
+
+        snapshot_df = pd.read_pickle(snapshot_path)
+
+        watermark = snapshot_df['order_date'].max()
+
+        new_df = collect_data(
+            conn_string   = conn_string,
+            pushdown_join = pushdown_join,
+            since         = watermark,
+            categorical   = categorical
+        )
+
+        # An empty new_df would upcast the numeric columns to object
+        frames = [snapshot_df[snapshot_df['order_date'] < watermark]]
+        if len(new_df) > 0:
+            frames.append(new_df)
+
+        df = pd.concat(
+            frames,
+            axis = 0,
+            ignore_index = True
+        )
+
+        # Categories may differ between snapshot and new rows
+        if categorical:
+            cat_cols = ['category_1', 'category_2', 'frame_material', 'city', 'state']
+            df[cat_cols] = df[cat_cols].astype("category")
+
+    else:
+
+        df = collect_data(
+            conn_string   = conn_string,
+            pushdown_join = pushdown_join,
+            categorical   = categorical
+        )
+
+    snapshot_path.parent.mkdir(parents = True, exist_ok = True)
+    df.to_pickle(snapshot_path)
 
     return df
 
 
 # PREP FORECAST -----
+
+# Dates are stored as days since EPOCH with storage = "native"
+EPOCH = pd.Timestamp("1970-01-01")
+
 @pf.register_dataframe_method
 def prep_forecast_data_for_update(
     data, id_column, date_column
@@ -137,6 +411,8 @@ def write_forecast_to_database(
     conn_string = "sqlite:///00_database/bike_orders_database.sqlite", 
     table_name = "forecast",
     if_exists = "fail",
+    batch_size = 10000,
+    storage = "string",
     **kwargs
 ):
     """Writes the forecast table to the database
@@ -154,8 +430,18 @@ def write_forecast_to_database(
             Table name for the table to be created or modified. Defaults to "forecast".
         if_exists (str, optional): 
             Used to determine how the table is updated if the table exists. Passed to pandas.to_sql(). Defaults to "fail".
+            Use "upsert" to insert or update rows keyed on (id, date) without rebuilding the table. 
+            The table and a unique index on (id, date) are created if needed.
+        batch_size (int, optional): 
+            Number of rows sent per executemany() call when if_exists = "upsert". 
+            All batches are written in a single transaction. Defaults to 10000.
+        storage (str, optional): 
+            One of "string" or "native". "string" stores dates as text and numbers as NUMERIC. 
+            "native" stores dates as INTEGER days since 1970-01-01 and numbers as REAL, 
+            which read_forecast_from_database() converts back without parsing strings. 
+            Use the same storage for every write to a table. Defaults to "string".
         **kwargs: 
-            Additional arguments passed to pandas.to_sql().
+            Additional arguments passed to pandas.to_sql(). Ignored when if_exists = "upsert".
 
     See also:
         - my_pandas_extensions.forecasting.arima_forecast()
@@ -187,31 +473,64 @@ def write_forecast_to_database(
     #                
     # 
 
-    sql_dtype = {
-        "id"         : String(),
-        "date"       : String(),
-        "value"      : Numeric(),
-        "predictions" : Numeric(),
-        "ci_low"      : Numeric(),
-        "ci_high"      : Numeric()
-    }
+    if storage == "string":
+        sql_dtype = {
+            "id"         : String(),
+            "date"       : String(),
+            "value"      : Numeric(),
+            "predictions" : Numeric(),
+            "ci_low"      : Numeric(),
+            "ci_high"      : Numeric()
+        }
+    elif storage == "native":
+        df = df.assign(date = lambda x: (x['date'] - EPOCH).dt.days)
+
+        sql_dtype = {
+            "id"          : String(),
+            "date"        : Integer(),
+            "value"       : Float(),
+            "predictions" : Float(),
+            "ci_low"      : Float(),
+            "ci_high"     : Float()
+        }
+    else:
+        raise ValueError("`storage` must be one of 'string' or 'native'.")
 
     # Connect to Database
 
-    engine = sql.create_engine(conn_string)
+    engine = get_engine(conn_string)
 
     conn = engine.connect()
 
     # Make Table
 
-    df.to_sql(
-        con       = conn,
-        name      = table_name,
-        if_exists = if_exists,
-        dtype     = sql_dtype,
-        index     = False,
-        **kwargs
-    )
+    if if_exists == "upsert":
+        upsert_to_database(
+            data        = df,
+            conn        = conn,
+            table_name  = table_name,
+            key_columns = ['id', 'date'],
+            dtype       = sql_dtype,
+            batch_size  = batch_size
+        )
+    else:
+        df.to_sql(
+            con       = conn,
+            name      = table_name,
+            if_exists = if_exists,
+            dtype     = sql_dtype,
+            index     = False,
+            **kwargs
+        )
+
+    # Index used by filtered reads in read_forecast_from_database(),
+    # unless one on (id, date) exists (e.g. the upsert unique index)
+    with conn.begin():
+        if not has_index(conn, table_name, ['id', 'date']):
+            conn.execute(sql.text(
+                f'CREATE INDEX IF NOT EXISTS "ix_{table_name}_id_date_lookup" '
+                f'ON "{table_name}" ("id", "date")'
+            ))
 
     # Close connection
     conn.close()
@@ -223,17 +542,38 @@ def write_forecast_to_database(
 def read_forecast_from_database(
     conn_string = "sqlite:///00_database/bike_orders_database.sqlite",
     table_name = "forecast",
+    ids = None,
+    id_prefix = None,
+    start = None,
+    end = None,
+    columns = None,
     **kwargs
 ):
     """
     Read a forecast from the database
     
+    Filters are pushed into a parameterized WHERE clause, so only the 
+    matching rows are read. write_forecast_to_database() creates an 
+    index on (id, date) to support them. Rows are returned sorted by 
+    id and date.
+    
     Args:
         conn_string (str, optional): 
             A slqalchemy connection string to find the database. 
             Defaults to "sqlite:///00_database/bike_orders_database.sqlite".
         table_name (str, optional): 
             The SQL table containing the forecast. Defaults to "forecast".
+        ids (str or list, optional): 
+            One or more ids to read. Defaults to None (all ids).
+        id_prefix (str or list, optional): 
+            One or more non-empty prefixes such as "Category 1". Ids starting 
+            with any of the prefixes are read. Defaults to None (all ids).
+        start (str or Timestamp, optional): 
+            First date to read (inclusive). Defaults to None.
+        end (str or Timestamp, optional): 
+            Last date to read (inclusive). Defaults to None.
+        columns (list, optional): 
+            Columns to read. Defaults to None (all columns).
     
     Returns:
         DataFrame: A pandas data frame with the following columns:
@@ -243,29 +583,476 @@ def read_forecast_from_database(
             - predictions: The predicted values
             - ci_low: The lower confidence interval
             - ci_high: the upper confidence interval
+
+        Dates stored as text or as days since 1970-01-01 (storage = "native" in 
+        write_forecast_to_database()) are both returned as datetime64.
     """
 
     # Connect to Database
 
-    engine = sql.create_engine(conn_string)
+    engine = get_engine(conn_string)
 
     conn = engine.connect()
 
+    # Build the query
+
+    if columns is None:
+        select_text = "*"
+    else:
+        if type(columns) is not list:
+            columns = [columns]
+        select_text = ", ".join(f'"{c}"' for c in columns)
+
+    conditions = []
+    params     = {}
+
+    if ids is not None:
+        if type(ids) is not list:
+            ids = [ids]
+        id_params = {f"id_{i}": id for i, id in enumerate(ids)}
+        id_text   = ", ".join(f":{k}" for k in id_params)
+        conditions.append(f'"id" IN ({id_text})')
+        params.update(id_params)
+
+    if id_prefix is not None:
+        if type(id_prefix) is not list:
+            id_prefix = [id_prefix]
+        if any(len(prefix) == 0 for prefix in id_prefix):
+            raise ValueError("`id_prefix` must not contain empty strings.")
+        # Range predicates (instead of LIKE) can use the index on id
+        prefix_conditions = []
+        for i, prefix in enumerate(id_prefix):
+            upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+            prefix_conditions.append(
+                f'("id" >= :prefix_{i} AND "id" < :prefix_upper_{i})'
+            )
+            params[f"prefix_{i}"]       = prefix
+            params[f"prefix_upper_{i}"] = upper
+        conditions.append("(" + " OR ".join(prefix_conditions) + ")")
+
+    if start is not None or end is not None:
+
+        # Match the stored format of the date column
+        date_col = [
+            c for c in sql.inspect(conn).get_columns(table_name) 
+            if c['name'] == 'date'
+        ][0]
+        native_dates = isinstance(date_col['type'], sql.types.Integer)
+
+        def format_date(date):
+            date = pd.Timestamp(date)
+            if native_dates:
+                return (date - EPOCH).days
+            return date.strftime("%Y-%m-%d %H:%M:%S")
+
+        if start is not None:
+            conditions.append('"date" >= :start')
+            params["start"] = format_date(start)
+
+        if end is not None:
+            conditions.append('"date" <= :end')
+            params["end"] = format_date(end)
+
+    query = f"SELECT {select_text} FROM {table_name}"
+    if len(conditions) > 0:
+        query += " WHERE " + " AND ".join(conditions)
+    query += ' ORDER BY "id", "date"'
+
     # Read from table
 
     df = pd.read_sql(
-        f"SELECT * FROM {table_name}",
-        con = conn,
-        parse_dates= ['date']
+        sql.text(query),
+        con    = conn,
+        params = params
     )
 
     # Close connection
 
     conn.close()
 
+    # Convert dates
+
+    if 'date' in df.columns:
+        if pd.api.types.is_numeric_dtype(df['date']):
+            df['date'] = EPOCH + pd.to_timedelta(df['date'], unit = 'D')
+
+            # REAL columns that are entirely NULL come back as object
+            value_cols = df.columns.intersection(
+                ['value', 'predictions', 'ci_low', 'ci_high']
+            )
+            df[value_cols] = df[value_cols].astype("float64")
+        else:
+            df['date'] = pd.to_datetime(df['date'])
+
     return df
 
+# MIGRATE ----
+
+# Column names used by older versions of the forecast table
+LEGACY_FORECAST_COLUMNS = {
+    "prediction" : "predictions",
+    "ci_lo"      : "ci_low",
+    "ci_hi"      : "ci_high"
+}
+
+def migrate_forecast_table(
+    conn_string = "sqlite:///00_database/bike_orders_database.sqlite",
+    table_name = "forecast",
+    storage = "string"
+):
+    """
+    Rebuilds a forecast table written by an older version of 
+    write_forecast_to_database() so that it can be upserted into.
+
+    Legacy columns (prediction, ci_lo, ci_hi) are renamed, duplicate 
+    (id, date) rows are dropped and the table is rewritten with if_exists = "replace". Tables that already have the 
+    current columns, or do not exist, are left unchanged.
+
+    Args:
+        conn_string (str, optional): 
+            A SQLAlchemy connection string. Defaults to "sqlite:///00_database/bike_orders_database.sqlite".
+        table_name (str, optional): 
+            The forecast table. Defaults to "forecast".
+        storage (str, optional): 
+            Passed to write_forecast_to_database(). Defaults to "string".
+
+    Returns:
+        bool: True if the table was rebuilt.
+    """
+
+    required_col_names = [
+        'id', 'date', 'value', 
+        'predictions', 'ci_low', 'ci_high'
+    ]
+
+    engine = get_engine(conn_string)
+
+    conn = engine.connect()
+
+    if sql.inspect(conn).has_table(table_name):
+        table_cols = [c['name'] for c in sql.inspect(conn).get_columns(table_name)]
+    else:
+        table_cols = required_col_names
+
+    conn.close()
+
+    if all(pd.Series(required_col_names).isin(table_cols)):
+        return False
+
+    df = read_forecast_from_database(
+        conn_string = conn_string,
+        table_name  = table_name
+    ) \
+        .rename(LEGACY_FORECAST_COLUMNS, axis = 1) \
+        .drop_duplicates(subset = ['id', 'date'], keep = 'last')
+
+    df.write_forecast_to_database(
+        id_column   = "id",
+        date_column = "date",
+        conn_string = conn_string,
+        table_name  = table_name,
+        if_exists   = "replace",
+        storage     = storage
+    )
+
+    return True
+
+# ROLLUP CUBE ----
+
+@pf.register_dataframe_method
+def write_rollup_cube_to_database(
+    data,
+    conn_string = "sqlite:///00_database/bike_orders_database.sqlite",
+    table_name = "orderlines_cube"
+):
+    """
+    Writes a rollup cube (daily totals by dimension) to the database,
+    replacing the previous cube.
+
+    Args:
+        data (DataFrame): 
+            A rollup cube made by my_pandas_extensions.timeseries.build_rollup_cube().
+        conn_string (str, optional): 
+            A SQLAlchemy connection string. Defaults to "sqlite:///00_database/bike_orders_database.sqlite".
+        table_name (str, optional): 
+            Table name for the cube. Defaults to "orderlines_cube".
+
+    See also:
+        - read_rollup_cube_from_database()
+    """
+
+    cube_attrs = data.attrs.get("rollup_cube")
+    if cube_attrs is None:
+        raise ValueError("`data` is not a rollup cube. See build_rollup_cube().")
+
+    date_column = cube_attrs["date_column"]
+
+    df = data.assign(**{date_column: lambda x: x[date_column].dt.strftime("%Y-%m-%d")})
+
+    engine = get_engine(conn_string)
+
+    conn = engine.connect()
+
+    df.to_sql(
+        con       = conn,
+        name      = table_name,
+        if_exists = "replace",
+        dtype     = {date_column: String()},
+        index     = False
+    )
+
+    conn.close()
+
+    pass
+
+def read_rollup_cube_from_database(
+    conn_string = "sqlite:///00_database/bike_orders_database.sqlite",
+    table_name = "orderlines_cube",
+    date_column = "order_date",
+    value_column = "total_price",
+    dimensions = None
+):
+    """
+    Reads a rollup cube written by write_rollup_cube_to_database(). 
+    
+    summarize_by_time() answers sums and means from the returned data frame 
+    when the groups are a subset of the cube dimensions, so it can be used 
+    in place of collect_data() for those summaries.
+
+    Args:
+        conn_string (str, optional): 
+            A SQLAlchemy connection string. Defaults to "sqlite:///00_database/bike_orders_database.sqlite".
+        table_name (str, optional): 
+            The table containing the cube. Defaults to "orderlines_cube".
+        date_column (str, optional): 
+            The cube's date column. Defaults to "order_date".
+        value_column (str or list, optional): 
+            The value column(s) totalled in the cube. Defaults to "total_price".
+        dimensions (list, optional): 
+            The cube dimensions. Defaults to None (every other column).
+
+    Returns:
+        DataFrame: The rollup cube.
+    """
+
+    if type(value_column) is not list:
+        value_column = [value_column]
+
+    engine = get_engine(conn_string)
+
+    conn = engine.connect()
+
+    df = pd.read_sql(sql.text(f"SELECT * FROM {table_name}"), con = conn)
+
+    conn.close()
+
+    df[date_column] = pd.to_datetime(df[date_column])
+
+    if dimensions is None:
+        count_columns = [f"{col}_count" for col in value_column]
+        dimensions = [
+            col for col in df.columns 
+            if col not in [date_column, *value_column, *count_columns]
+        ]
+
+    return as_rollup_cube(
+        df,
+        date_column  = date_column,
+        value_column = value_column,
+        dimensions   = dimensions
+    )
+
 # UTILIITIES -----
+def upsert_to_database(
+    data, conn, table_name, key_columns, dtype = None, batch_size = 10000
+):
+    """
+    Inserts or updates rows of a table in a single transaction using 
+    INSERT ... ON CONFLICT (SQLite >= 3.24 and PostgreSQL).
+
+    If the table does not exist it is created from `data` and `dtype`. A 
+    unique index on `key_columns` is created if the table has none. A 
+    non-unique index with the same name is replaced.
+
+    Args:
+        data (DataFrame): The rows to write. Column names must match the table.
+        conn (Connection): An open SQLAlchemy connection.
+        table_name (str): The table to update.
+        key_columns (list): Columns that uniquely identify a row.
+        dtype (dict, optional): SQLAlchemy types used if the table is created.
+        batch_size (int, optional): Rows per executemany() call. Defaults to 10000.
+    """
+
+    # Checks
+    if type(batch_size) is not int or batch_size < 1:
+        raise ValueError("`batch_size` must be a positive integer.")
+
+    df = data.copy()
+
+    # Keys must match the stored strings exactly
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%d %H:%M:%S")
+
+    # SQL
+    cols_text   = ", ".join(f'"{c}"' for c in df.columns)
+    keys_text   = ", ".join(f'"{c}"' for c in key_columns)
+    values_text = ", ".join(f":p{i}" for i in range(len(df.columns)))
+    update_text = ", ".join(
+        f'"{c}" = excluded."{c}"' for c in df.columns if c not in key_columns
+    )
+
+    index_name  = f'ix_{table_name}_{"_".join(key_columns)}'
+
+    index_query = sql.text(
+        f'CREATE UNIQUE INDEX "{index_name}" ON "{table_name}" ({keys_text})'
+    )
+
+    upsert_query = sql.text(
+        f'INSERT INTO "{table_name}" ({cols_text}) VALUES ({values_text}) '
+        f'ON CONFLICT ({keys_text}) DO UPDATE SET {update_text}'
+    )
+
+    # Missing values are written as NULL
+    records = df \
+        .astype(object) \
+        .where(df.notna(), None) \
+        .itertuples(index = False, name = None)
+
+    param_names = [f"p{i}" for i in range(len(df.columns))]
+    params_list = [dict(zip(param_names, row)) for row in records]
+
+    # Write in a single transaction
+    with conn.begin():
+
+        # Create the table if needed
+        if not sql.inspect(conn).has_table(table_name):
+            df.head(0).to_sql(
+                con       = conn,
+                name      = table_name,
+                dtype     = dtype,
+                index     = False
+            )
+        else:
+            table_cols = [c['name'] for c in sql.inspect(conn).get_columns(table_name)]
+            if not all(pd.Series(df.columns).isin(table_cols)):
+                col_text = ", ".join(df.columns)
+                raise Exception(
+                    f"Table `{table_name}` must contain columns: {col_text}. "
+                    "Rebuild it with if_exists = 'replace' (forecast tables can be "
+                    "migrated with migrate_forecast_table())."
+                )
+
+        # ON CONFLICT needs a unique index on exactly the key columns
+        if not has_index(conn, table_name, key_columns, unique = True):
+            index_names = [ix['name'] for ix in sql.inspect(conn).get_indexes(table_name)]
+            if index_name in index_names:
+                conn.execute(sql.text(f'DROP INDEX "{index_name}"'))
+            conn.execute(index_query)
+
+        for i in range(0, len(params_list), batch_size):
+            conn.execute(upsert_query, params_list[i:i + batch_size])
+
+def has_index(conn, table_name, columns, unique = False):
+    """
+    Checks whether a table has an index (or unique constraint) on exactly 
+    `columns`, in any order.
+
+    Args:
+        conn (Connection): An open SQLAlchemy connection.
+        table_name (str): The table to inspect.
+        columns (list): The indexed columns.
+        unique (bool, optional): Only count unique indexes. Defaults to False.
+
+    Returns:
+        bool: True if a matching index exists.
+    """
+
+    inspector = sql.inspect(conn)
+
+    indexes = [
+        ix for ix in inspector.get_indexes(table_name) 
+        if ix['unique'] or not unique
+    ]
+    indexes += inspector.get_unique_constraints(table_name)
+
+    return any(
+        sorted(ix['column_names']) == sorted(columns) for ix in indexes
+    )
+
+def join_orderlines_data(orderlines_df, bikes_df, bikeshops_df):
+    """
+    Joins orderlines to the bikes and bikeshops tables and 
+    adds the total.price column.
+    """
+
+    joined_df = pd.DataFrame(orderlines_df) \
+        .merge(
+            right    = bikes_df,
+            how      = 'left',
+            left_on  = 'product.id',
+            right_on = 'bike.id'
+        ) \
+        .merge(
+            right    = bikeshops_df,
+            how      = "left",
+            left_on  = "customer.id",
+            right_on = 'bikeshop.id'
+        )
+
+    joined_df['total.price'] = joined_df['quantity'] * joined_df['price']
+
+    return joined_df
+
+def clean_orderlines_data(data, categorical = False):
+    """
+    Cleans the joined orderlines data: parses dates, splits the 
+    description and location columns, keeps the needed columns and 
+    replaces "." with "_" in the column names.
+
+    Args:
+        data (DataFrame): Joined orderlines, bikes and bikeshops data.
+        categorical (bool, optional): 
+            Whether the split columns use the "category" dtype. 
+            Defaults to False.
+
+    Returns:
+        DataFrame: The cleaned data frame.
+    """
+
+    df = data
+
+    df['order.date'] = pd.to_datetime(df['order.date'])
+
+    # Text columns have few distinct values: split each distinct value once
+    temp_df = split_distinct_values(
+        df['description'], sep = " - ", 
+        names = ['category.1', 'category.2', 'frame.material'],
+        categorical = categorical
+    )
+    df[temp_df.columns] = temp_df
+
+    temp_df = split_distinct_values(
+        df['location'], sep = ", ", 
+        names = ['city', 'state'],
+        categorical = categorical
+    )
+    df[temp_df.columns] = temp_df
+
+    # Columns to keep
+    cols_to_keep_list = [
+        'order.id', 'order.line', 'order.date',    
+        'quantity', 'price', 'total.price', 
+        'model', 'category.1', 'category.2', 'frame.material', 
+        'bikeshop.name', 'city', 'state'
+    ]
+
+    df = df[cols_to_keep_list]
+
+    df.columns = df.columns.str.replace(".", "_",regex=False)
+
+    return df
+
 def convert_to_datetime(data, date_column):
 
     df_prepped = data
@@ -281,3 +1068,47 @@ def convert_to_datetime(data, date_column):
                 raise Exception("Could not auto-convert `date_column` to datetime64.")
 
     return df_prepped
+
+def split_distinct_values(data, sep, names, categorical = False):
+    """
+    Splits a low-cardinality text Series into several columns, parsing 
+    each distinct value only once and mapping the result back by code.
+
+    Args:
+        data (Series): A text Series, such as a description or location.
+        sep (str): The separator to split on.
+        names (list): Names of the resulting columns, one per split part.
+        categorical (bool, optional): 
+            Whether to return "category" dtype columns. Defaults to False.
+
+    Returns:
+        DataFrame: One column per name, aligned with the index of `data`.
+    """
+
+    codes, uniques = pd.factorize(data)
+
+    # No rows (e.g. nothing newer than the watermark): empty columns
+    if len(uniques) == 0:
+        dtype = "category" if categorical else object
+        return pd.DataFrame(
+            {name: pd.Series(index = data.index, dtype = dtype) for name in names}
+        )
+
+    parts_df = pd.Series(uniques).str.split(sep, expand = True)
+
+    ret = {}
+    for i, name in enumerate(names):
+
+        part_codes, part_uniques = pd.factorize(parts_df[i])
+
+        # Codes of -1 (missing) stay missing
+        row_codes = np.where(codes == -1, -1, part_codes[codes])
+
+        col = pd.Categorical.from_codes(row_codes, categories = part_uniques)
+
+        if not categorical:
+            col = col.astype(parts_df[i].dtype)
+
+        ret[name] = col
+
+    return pd.DataFrame(ret, index = data.index)
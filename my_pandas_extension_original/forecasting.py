@@ -0,0 +1,915 @@
+# IMPORTS ----
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+import json
+import os
+import pathlib
+import pickle
+import time
+
+import pandas as pd
+import numpy as np
+
+import pandas_flavor as pf
+
+from scipy.stats import norm
+
+from sktime.forecasting.arima import AutoARIMA, ARIMA
+from tqdm import tqdm
+
+from plotnine import (
+    ggplot, aes, geom_ribbon, geom_line, facet_wrap,
+    scale_x_datetime, scale_y_continuous, scale_color_manual,
+    theme_minimal, theme, labs
+)
+from mizani.formatters import dollar_format
+
+from plydata.cat_tools import cat_reorder
+
+
+# ARIMA FORECAST ----
+@pf.register_dataframe_method
+def arima_forecast(
+    data, h, sp,
+    alpha = 0.05,
+    suppress_warnings = True,
+    n_jobs = 1,
+    cache_dir = None,
+    cache_max_mb = 500,
+    cache_max_age_days = 30,
+    warm_start_dir = None,
+    warm_start_tolerance = 0.05,
+    engine = "auto_arima",
+    checkpoint_dir = None,
+    checkpoint_max_age_days = 7,
+    executor = None,
+    *args, **kwargs
+):
+    """
+    Generates ARIMA forecasts for one or more time series.
+
+    Args:
+        data (DataFrame):
+            Data must be in wide format, with a Period or Timestamp index
+            and one column per time series (e.g. from summarize_by_time()).
+            Sparse columns (summarize_by_time(wide_format = "sparse")) are
+            made dense one series at a time.
+        h (int):
+            The forecast horizon.
+        sp (int):
+            The seasonal period.
+        alpha (float, optional):
+            Contols the confidence interval. ALPHA = 1 - 95% (CI).
+            Defaults to 0.05.
+        suppress_warnings (bool, optional):
+            Suppresses ARIMA feedback during automated model training.
+            Defaults to True.
+        n_jobs (int, optional):
+            Number of worker processes used to fit the series. Each column
+            is fitted independently. 1 fits the series one after another
+            in this process, -1 uses all CPUs. Defaults to 1.
+        cache_dir (str, optional):
+            Directory of an on-disk cache of fitted forecasters. Series whose
+            values, index, sp and AutoARIMA arguments match a cached fit reuse
+            it and skip the stepwise search. Defaults to None (no cache).
+        cache_max_mb (float, optional):
+            Maximum size of the cache. The least recently used fits are
+            removed first. Defaults to 500.
+        cache_max_age_days (float, optional):
+            Fits not used for this many days are removed. Defaults to 30.
+        warm_start_dir (str, optional):
+            Directory where the ARIMA order selected for each series is kept.
+            When a previous order exists, it is refitted on the current series
+            first, and the full AutoARIMA search only runs if the fit quality
+            drifts beyond `warm_start_tolerance`. Defaults to None (always search).
+        warm_start_tolerance (float, optional):
+            Maximum relative change of the per-observation AIC, compared with
+            the fit that selected the order, before the order is searched
+            again. Defaults to 0.05.
+        engine (str, optional):
+            One of "auto_arima" or "seasonal_naive". "auto_arima" fits an
+            AutoARIMA model per column. "seasonal_naive" forecasts every column
+            at once with NumPy, repeating the last `sp` observations, with
+            prediction intervals from the seasonal-difference residuals. It is
+            much faster on many short series, and ignores the n_jobs, cache,
+            warm start and AutoARIMA arguments. Defaults to "auto_arima".
+        checkpoint_dir (str, optional):
+            Directory where the complete output is saved, keyed by a hash of
+            `data` and the forecasting arguments. A later call with unchanged
+            inputs returns the saved output without fitting. Combine with
+            `cache_dir` so that series finished before a failure are not
+            refitted either. Defaults to None (no checkpoint).
+        checkpoint_max_age_days (float, optional):
+            Checkpoints not written or used for this many days are removed
+            whenever a new checkpoint is saved, so checkpoints of older
+            input data do not pile up. None keeps every checkpoint. 
+            Defaults to 7.
+        executor (ProcessPoolExecutor, optional):
+            A process pool to submit the fits to instead of starting one, so
+            that several calls (e.g. from different threads) can share the
+            same workers. `n_jobs` is ignored and the pool is left running.
+            Defaults to None.
+        *args, **kwargs:
+            Additional arguments passed to sktime.forecasting.arima.AutoARIMA.
+
+    Returns:
+        DataFrame: A long format data frame with the group columns, the date
+        column and "value", "predictions", "ci_low" and "ci_high".
+
+    See also:
+        - my_pandas_extensions.timeseries.summarize_by_time()
+    """
+
+    # Checks
+    check_forecast_inputs(data, h, sp, n_jobs)
+
+    if engine not in ["auto_arima", "seasonal_naive"]:
+        raise ValueError("`engine` must be one of 'auto_arima' or 'seasonal_naive'.")
+
+    # Handle Inputs ----
+    df = data
+
+    # Stage Checkpoint
+    if checkpoint_dir is not None:
+        checkpoint_path = pathlib.Path(checkpoint_dir) / "{}.pkl".format(
+            get_forecast_fingerprint(
+                df, h, sp, alpha, suppress_warnings, engine, args, kwargs
+            )
+        )
+
+        if checkpoint_path.exists():
+            print(f"Forecast checkpoint found, skipping fit: {checkpoint_path}")
+            # Mark as recently used for eviction
+            os.utime(checkpoint_path)
+            return pd.read_pickle(checkpoint_path)
+
+    if engine == "seasonal_naive":
+        model_results_df = seasonal_naive_forecast(df, h = h, sp = sp, alpha = alpha)
+    else:
+        fit_kwargs = get_fit_kwargs(
+            h                    = h,
+            sp                   = sp,
+            alpha                = alpha,
+            suppress_warnings    = suppress_warnings,
+            cache_dir            = cache_dir,
+            warm_start_dir       = warm_start_dir,
+            warm_start_tolerance = warm_start_tolerance,
+            args                 = args,
+            kwargs               = kwargs
+        )
+
+        model_results_df = fit_auto_arima_forecast(
+            data               = df,
+            fit_kwargs         = fit_kwargs,
+            n_jobs             = n_jobs,
+            cache_max_mb       = cache_max_mb,
+            cache_max_age_days = cache_max_age_days,
+            executor           = executor
+        )
+
+    ret = format_forecast_results(model_results_df, df)
+
+    if checkpoint_dir is not None:
+        save_forecast_checkpoint(ret, checkpoint_path)
+        evict_forecast_checkpoints(checkpoint_dir, max_age_days = checkpoint_max_age_days)
+
+    return ret
+
+def get_fit_kwargs(
+    h, sp, alpha, suppress_warnings, 
+    cache_dir, warm_start_dir, warm_start_tolerance, 
+    args, kwargs
+):
+    """
+    Builds the fit_arima_series() keyword arguments shared by 
+    arima_forecast() and iter_arima_forecast().
+    """
+
+    forecaster_kwargs = dict(
+        sp                = sp,
+        suppress_warnings = suppress_warnings,
+        **kwargs
+    )
+
+    return dict(
+        h                    = h,
+        alpha                = alpha,
+        forecaster_args      = args,
+        forecaster_kwargs    = forecaster_kwargs,
+        cache_dir            = cache_dir,
+        warm_start_dir       = warm_start_dir,
+        warm_start_tolerance = warm_start_tolerance
+    )
+
+def fit_auto_arima_forecast(
+    data, fit_kwargs, n_jobs,
+    cache_max_mb, cache_max_age_days, executor = None
+):
+    """
+    Fits AutoARIMA to every column for arima_forecast() and returns the 
+    results stacked by (column, date), in column order.
+    """
+
+    df = data
+
+    # For Loop ----
+    results = {}
+    for col, ret, fit_type in iter_fit_arima_series(df, n_jobs, fit_kwargs, executor):
+        results[col] = (ret, fit_type)
+
+    # Fit Report
+    report_fit_types(
+        fit_types          = [fit_type for _, fit_type in results.values()],
+        cache_dir          = fit_kwargs['cache_dir'],
+        cache_max_mb       = cache_max_mb,
+        cache_max_age_days = cache_max_age_days,
+        warm_start_dir     = fit_kwargs['warm_start_dir']
+    )
+
+    # Keep column order
+    model_results_dict = {col: results[col][0] for col in df.columns}
+
+    # Stack Each Dict on Top of Each Other
+    model_results_df = pd.concat(model_results_dict, axis = 0)
+
+    return model_results_df
+
+def iter_arima_forecast(
+    data, h, sp,
+    alpha = 0.05,
+    suppress_warnings = True,
+    n_jobs = 1,
+    cache_dir = None,
+    cache_max_mb = 500,
+    cache_max_age_days = 30,
+    warm_start_dir = None,
+    warm_start_tolerance = 0.05,
+    executor = None,
+    *args, **kwargs
+):
+    """
+    Generates ARIMA forecasts for one or more time series, yielding the 
+    result for each series as soon as it is fitted.
+
+    Takes the same arguments as arima_forecast() (with engine = "auto_arima").
+    With n_jobs > 1 or an executor the series are yielded in the order they finish. 
+    Concatenating everything that is yielded gives the same rows as 
+    arima_forecast(), possibly in a different order.
+
+    Yields:
+        DataFrame: The arima_forecast() output for a single series.
+
+    See also:
+        - arima_forecast()
+    """
+
+    # Checks
+    check_forecast_inputs(data, h, sp, n_jobs)
+
+    # Handle Inputs ----
+    df = data
+
+    fit_kwargs = get_fit_kwargs(
+        h                    = h,
+        sp                   = sp,
+        alpha                = alpha,
+        suppress_warnings    = suppress_warnings,
+        cache_dir            = cache_dir,
+        warm_start_dir       = warm_start_dir,
+        warm_start_tolerance = warm_start_tolerance,
+        args                 = args,
+        kwargs               = kwargs
+    )
+
+    # For Loop ----
+    fit_types = []
+    for col, ret, fit_type in iter_fit_arima_series(df, n_jobs, fit_kwargs, executor):
+
+        fit_types.append(fit_type)
+
+        yield format_forecast_results(pd.concat({col: ret}, axis = 0), df)
+
+    # Fit Report
+    report_fit_types(
+        fit_types          = fit_types,
+        cache_dir          = cache_dir,
+        cache_max_mb       = cache_max_mb,
+        cache_max_age_days = cache_max_age_days,
+        warm_start_dir     = warm_start_dir
+    )
+
+def iter_fit_arima_series(data, n_jobs, fit_kwargs, executor = None):
+    """
+    Fits each column of `data` with fit_arima_series(), in this process 
+    (n_jobs = 1), in a new process pool (n_jobs > 1 or -1) or in a shared 
+    `executor`, and yields (column, result, fit type) as each fit finishes.
+    """
+
+    df = data
+
+    if executor is not None:
+        yield from iter_submitted_fits(df, fit_kwargs, executor)
+
+    elif n_jobs == 1:
+        for col in tqdm(df.columns, mininterval = 0):
+            ret, fit_type = fit_arima_series(get_dense_column(df, col), **fit_kwargs)
+            yield col, ret, fit_type
+
+    else:
+        max_workers = None if n_jobs == -1 else n_jobs
+
+        with ProcessPoolExecutor(max_workers = max_workers) as executor:
+            yield from iter_submitted_fits(df, fit_kwargs, executor)
+
+def iter_submitted_fits(data, fit_kwargs, executor):
+    """
+    Submits a fit_arima_series() call per column of `data` to `executor` 
+    and yields (column, result, fit type) as each fit finishes.
+    """
+
+    df = data
+
+    futures = {
+        executor.submit(fit_arima_series, get_dense_column(df, col), **fit_kwargs): col
+        for col in df.columns
+    }
+
+    try:
+        for future in tqdm(as_completed(futures), total = len(futures), mininterval = 0):
+            ret, fit_type = future.result()
+            yield futures[future], ret, fit_type
+    finally:
+        # Don't start new fits if the consumer stops early
+        for future in futures:
+            future.cancel()
+
+def get_dense_column(data, col):
+    """
+    Returns a column of `data` as a dense series, so that a sparse wide 
+    frame is never made dense as a whole.
+    """
+
+    y = data[col]
+
+    if isinstance(y.dtype, pd.SparseDtype):
+        y = y.sparse.to_dense()
+
+    return y
+
+def check_forecast_inputs(data, h, sp, n_jobs):
+    """
+    Validates the arguments shared by arima_forecast() and iter_arima_forecast().
+    """
+
+    if type(data) is not pd.DataFrame:
+        raise TypeError("`data` must be a Pandas DataFrame.")
+
+    if type(h) is not int:
+        raise TypeError("`h` must be an integer.")
+
+    if type(sp) is not int:
+        raise TypeError("`sp` must be an integer.")
+
+    if type(n_jobs) is not int or n_jobs == 0 or n_jobs < -1:
+        raise ValueError("`n_jobs` must be a positive integer or -1.")
+
+def report_fit_types(
+    fit_types, cache_dir, cache_max_mb, cache_max_age_days, warm_start_dir
+):
+    """
+    Prints forecaster cache and warm start counts, and evicts the cache.
+    """
+
+    fit_types = pd.Series(fit_types, dtype = object)
+
+    if cache_dir is not None:
+        n_hits = (fit_types == "cache").sum()
+        print(f"Forecaster cache: {n_hits} hits, {len(fit_types) - n_hits} misses")
+
+    if warm_start_dir is not None:
+        n_warm = (fit_types == "warm_start").sum()
+        n_search = (fit_types == "search").sum()
+        print(f"Warm start: {n_warm} orders reused, {n_search} full searches")
+
+    if cache_dir is not None:
+        evict_forecaster_cache(
+            cache_dir    = cache_dir,
+            max_mb       = cache_max_mb,
+            max_age_days = cache_max_age_days
+        )
+
+def format_forecast_results(model_results_df, data):
+    """
+    Names the stacked (column, date) index after the columns and index of 
+    the wide input `data`, and moves it into columns.
+    """
+
+    df = data
+
+    # Handle Column & Index Names
+    nms = [*df.columns.names, *df.index.names]
+    model_results_df.index.names = nms
+
+    # Reset Index
+    ret = model_results_df.reset_index()
+
+    # Drop columns containing "level_"
+    cols_to_keep = ~ret.columns.str.startswith("level_")
+    ret = ret.iloc[:, cols_to_keep]
+
+    return ret
+
+def fit_arima_series(
+    y, h, alpha, forecaster_args, forecaster_kwargs, 
+    cache_dir = None, warm_start_dir = None, warm_start_tolerance = 0.05
+):
+    """
+    Fits an AutoARIMA model to a single series and returns the actual
+    values, predictions and confidence intervals in one data frame, 
+    along with how the model was obtained: "cache", "warm_start" or "search".
+
+    Defined at module level so it can be sent to worker processes.
+    """
+
+    # Modeling
+    forecaster = None
+    fit_type   = "cache"
+
+    if cache_dir is not None:
+        key = get_series_fingerprint(y, forecaster_kwargs, *forecaster_args)
+        forecaster = load_cached_forecaster(cache_dir, key)
+
+    if forecaster is None and warm_start_dir is not None:
+        forecaster = fit_warm_start_arima(
+            y                 = y,
+            forecaster_args   = forecaster_args,
+            forecaster_kwargs = forecaster_kwargs,
+            warm_start_dir    = warm_start_dir,
+            tolerance         = warm_start_tolerance
+        )
+        fit_type = "warm_start"
+
+    if forecaster is None:
+        forecaster = AutoARIMA(*forecaster_args, **forecaster_kwargs)
+
+        forecaster.fit(y)
+        fit_type = "search"
+
+        if warm_start_dir is not None:
+            save_warm_start_order(
+                warm_start_dir, y, forecaster_args, forecaster_kwargs, forecaster
+            )
+
+    if cache_dir is not None and fit_type != "cache":
+        save_cached_forecaster(cache_dir, key, forecaster)
+
+    # Predictions & Confidence Intervals
+    predictions, conf_int_df = forecaster.predict(
+        fh              = np.arange(1, h + 1),
+        return_pred_int = True,
+        alpha           = alpha
+    )
+
+    # Combine into data frame
+    ret = pd.concat([y, predictions, conf_int_df], axis = 1)
+    ret.columns = ["value", "predictions", "ci_low", "ci_high"]
+
+    return ret, fit_type
+
+
+# SEASONAL NAIVE ----
+def seasonal_naive_forecast(data, h, sp, alpha = 0.05):
+    """
+    Seasonal naive forecasts for every column of a wide data frame at once.
+
+    The forecast for step i is the observation one season (sp) before it.
+    Prediction intervals use the RMSE of the seasonal-difference residuals, 
+    scaled by the square root of the number of seasons ahead.
+
+    Returns:
+        DataFrame: "value", "predictions", "ci_low" and "ci_high", indexed by 
+        (column, date), stacked in column order like arima_forecast().
+    """
+
+    df = data
+
+    n, k = df.shape
+
+    if n < sp:
+        raise ValueError("Each series must have at least `sp` observations.")
+
+    y = df.to_numpy(dtype = "float64")
+
+    # Point forecasts: repeat the last season
+    steps = np.arange(h)
+    last_season = y[n - sp:]
+    predictions = last_season[steps % sp]
+
+    # Intervals
+    residuals = y[sp:] - y[:-sp]
+    if len(residuals) > 0:
+        sigma = np.sqrt(np.nanmean(residuals ** 2, axis = 0))
+    else:
+        sigma = np.full(k, np.nan)
+
+    seasons_ahead = (steps // sp + 1)[:, None]
+    margin = norm.ppf(1 - alpha / 2) * sigma[None, :] * np.sqrt(seasons_ahead)
+
+    # Combine history and future
+    future_index = make_future_index(df.index, h)
+    full_index   = df.index.append(future_index)
+
+    nan_history = np.full((n, k), np.nan)
+    nan_future  = np.full((h, k), np.nan)
+
+    values_mat      = np.vstack([y, nan_future])
+    predictions_mat = np.vstack([nan_history, predictions])
+    ci_low_mat      = np.vstack([nan_history, predictions - margin])
+    ci_high_mat     = np.vstack([nan_history, predictions + margin])
+
+    # Stack columns on top of each other
+    n_full = n + h
+
+    col_levels = [
+        df.columns.get_level_values(i).repeat(n_full) 
+        for i in range(df.columns.nlevels)
+    ]
+    date_level = full_index[np.tile(np.arange(n_full), k)]
+
+    ret = pd.DataFrame(
+        {
+            "value"       : values_mat.T.ravel(),
+            "predictions" : predictions_mat.T.ravel(),
+            "ci_low"      : ci_low_mat.T.ravel(),
+            "ci_high"     : ci_high_mat.T.ravel()
+        },
+        index = pd.MultiIndex.from_arrays([*col_levels, date_level])
+    )
+
+    return ret
+
+def make_future_index(index, h):
+    """
+    The `h` periods following a PeriodIndex or a DatetimeIndex with a frequency.
+    """
+
+    if isinstance(index, pd.PeriodIndex):
+        return pd.period_range(start = index[-1] + 1, periods = h, freq = index.freq)
+
+    freq = index.freq if index.freq is not None else pd.infer_freq(index)
+
+    if freq is None:
+        raise ValueError("Could not determine the frequency of the date index.")
+
+    return pd.date_range(start = index[-1], periods = h + 1, freq = freq)[1:]
+
+
+# WARM START ----
+
+# AutoARIMA arguments that ARIMA also takes, forwarded to the warm start refit
+WARM_START_ARIMA_KWARGS = [
+    "start_params", "method", "maxiter", "suppress_warnings",
+    "out_of_sample_size", "scoring", "scoring_args", "trend"
+]
+
+def get_warm_start_path(warm_start_dir, y, forecaster_args, forecaster_kwargs):
+    """
+    Path of the stored order for a series. Unlike the forecaster cache, the 
+    key only uses the series name and AutoARIMA arguments, not its values, 
+    so the order carries over when new observations are added.
+    """
+
+    hasher = hashlib.sha256()
+
+    hasher.update(repr(y.name).encode())
+    hasher.update(repr(sorted(forecaster_kwargs.items())).encode())
+    hasher.update(repr(forecaster_args).encode())
+
+    return pathlib.Path(warm_start_dir) / f"{hasher.hexdigest()}.json"
+
+def get_fitted_arima_model(forecaster):
+    """
+    Returns the fitted pmdarima ARIMA model inside an sktime AutoARIMA or 
+    ARIMA forecaster.
+    """
+
+    # sktime keeps the pmdarima estimator in `_forecaster`; 
+    # pmdarima's AutoARIMA keeps the selected model in `model_`
+    model = forecaster._forecaster
+
+    return getattr(model, "model_", model)
+
+def save_warm_start_order(
+    warm_start_dir, y, forecaster_args, forecaster_kwargs, forecaster
+):
+    """
+    Stores the order, seasonal order, intercept and per-observation AIC 
+    selected by AutoARIMA for a series.
+    """
+
+    model = get_fitted_arima_model(forecaster)
+
+    order_dict = {
+        "order"          : list(model.order),
+        "seasonal_order" : list(model.seasonal_order),
+        "with_intercept" : bool(model.with_intercept),
+        "aic_per_obs"    : float(model.aic()) / len(y)
+    }
+
+    path = get_warm_start_path(warm_start_dir, y, forecaster_args, forecaster_kwargs)
+    path.parent.mkdir(parents = True, exist_ok = True)
+
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+    with open(tmp_path, "w") as f:
+        json.dump(order_dict, f)
+
+    os.replace(tmp_path, path)
+
+def fit_warm_start_arima(
+    y, forecaster_args, forecaster_kwargs, warm_start_dir, tolerance = 0.05
+):
+    """
+    Refits the previously selected model (order, seasonal order and 
+    intercept, with the AutoARIMA arguments that ARIMA shares) on the series. 
+    Returns the fitted forecaster, or None when there is no stored order, the 
+    fit fails, or the per-observation AIC drifts more than `tolerance` 
+    (relative) from the fit that selected the order.
+    """
+
+    path = get_warm_start_path(warm_start_dir, y, forecaster_args, forecaster_kwargs)
+
+    try:
+        with open(path) as f:
+            order_dict = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # Orders saved without the intercept are searched again
+    if "with_intercept" not in order_dict:
+        return None
+
+    arima_kwargs = {
+        k: v for k, v in forecaster_kwargs.items() 
+        if k in WARM_START_ARIMA_KWARGS
+    }
+
+    forecaster = ARIMA(
+        order          = tuple(order_dict["order"]),
+        seasonal_order = tuple(order_dict["seasonal_order"]),
+        with_intercept = order_dict["with_intercept"],
+        **arima_kwargs
+    )
+
+    try:
+        forecaster.fit(y)
+        aic_per_obs = float(get_fitted_arima_model(forecaster).aic()) / len(y)
+    except Exception:
+        return None
+
+    old_aic_per_obs = order_dict["aic_per_obs"]
+    drift = abs(aic_per_obs - old_aic_per_obs) / max(abs(old_aic_per_obs), 1e-8)
+
+    if not np.isfinite(drift) or drift > tolerance:
+        return None
+
+    return forecaster
+
+
+# CHECKPOINTS ----
+def get_forecast_fingerprint(
+    data, h, sp, alpha, suppress_warnings, engine, args, kwargs
+):
+    """
+    Hashes a wide data frame (values, index and column labels) together 
+    with the arguments that change the forecast. Used as the checkpoint key.
+    """
+
+    hasher = hashlib.sha256()
+
+    hasher.update(pd.util.hash_pandas_object(data, index = True).values.tobytes())
+    hasher.update(repr(list(data.columns)).encode())
+    hasher.update(repr([*data.columns.names, *data.index.names]).encode())
+    hasher.update(str(data.index.dtype).encode())
+    hasher.update(repr((h, sp, alpha, suppress_warnings, engine)).encode())
+    hasher.update(repr(args).encode())
+    hasher.update(repr(sorted(kwargs.items())).encode())
+
+    return hasher.hexdigest()
+
+def save_forecast_checkpoint(data, path):
+    """
+    Pickles a forecast to `path`, writing to a temporary file first so an 
+    interrupted run never leaves a partial checkpoint.
+    """
+
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents = True, exist_ok = True)
+
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+    data.to_pickle(tmp_path)
+
+    os.replace(tmp_path, path)
+
+def evict_forecast_checkpoints(checkpoint_dir, max_age_days = 7):
+    """
+    Removes checkpoints that have not been written or used for 
+    `max_age_days`. Uses the same concurrency-safe eviction as the 
+    forecaster cache.
+    """
+
+    evict_forecaster_cache(
+        cache_dir    = checkpoint_dir,
+        max_mb       = None,
+        max_age_days = max_age_days
+    )
+
+
+# FORECASTER CACHE ----
+def get_series_fingerprint(y, forecaster_kwargs, *args):
+    """
+    Hashes a series' values and index together with the AutoARIMA 
+    arguments (including sp). Used as the forecaster cache key.
+    """
+
+    hasher = hashlib.sha256()
+
+    hasher.update(pd.util.hash_pandas_object(y, index = True).values.tobytes())
+    hasher.update(str(y.index.dtype).encode())
+    hasher.update(repr(sorted(forecaster_kwargs.items())).encode())
+    hasher.update(repr(args).encode())
+
+    return hasher.hexdigest()
+
+def load_cached_forecaster(cache_dir, key):
+    """
+    Returns the cached fitted forecaster for `key`, or None on a miss.
+    """
+
+    path = pathlib.Path(cache_dir) / f"{key}.pkl"
+
+    try:
+        with open(path, "rb") as f:
+            forecaster = pickle.load(f)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+    # Mark as recently used for eviction
+    os.utime(path)
+
+    return forecaster
+
+def save_cached_forecaster(cache_dir, key, forecaster):
+    """
+    Saves a fitted forecaster to the cache. The file is written under a 
+    temporary name and then renamed, so concurrent workers never read 
+    a partial file.
+    """
+
+    cache_path = pathlib.Path(cache_dir)
+    cache_path.mkdir(parents = True, exist_ok = True)
+
+    tmp_path = cache_path / f"{key}.{os.getpid()}.tmp"
+
+    with open(tmp_path, "wb") as f:
+        pickle.dump(forecaster, f)
+
+    os.replace(tmp_path, cache_path / f"{key}.pkl")
+
+def evict_forecaster_cache(cache_dir, max_mb = 500, max_age_days = 30):
+    """
+    Removes cached forecasters that have not been used for `max_age_days`,
+    then removes the least recently used ones until the cache is smaller 
+    than `max_mb`.
+
+    Safe to run from several processes at once: files removed by another 
+    caller are skipped.
+    """
+
+    cache_path = pathlib.Path(cache_dir)
+
+    if not cache_path.is_dir():
+        return
+
+    files = []
+    for p in cache_path.glob("*.pkl"):
+        try:
+            files.append((p, p.stat()))
+        except FileNotFoundError:
+            continue
+
+    files = sorted(files, key = lambda x: x[1].st_mtime)
+
+    # Age
+    if max_age_days is not None:
+        cutoff = time.time() - max_age_days * 86400
+        for p, stat in files:
+            if stat.st_mtime < cutoff:
+                p.unlink(missing_ok = True)
+        files = [(p, stat) for p, stat in files if stat.st_mtime >= cutoff]
+
+    # Size, oldest first
+    if max_mb is not None:
+        total_size = sum(stat.st_size for _, stat in files)
+        for p, stat in files:
+            if total_size <= max_mb * 2**20:
+                break
+            p.unlink(missing_ok = True)
+            total_size -= stat.st_size
+
+
+# PLOT FORECAST ----
+@pf.register_dataframe_method
+def plot_forecast(
+    data, id_column, date_column,
+    ribbon_alpha = 0.2, facet_ncol = 1, facet_scales = "free_y",
+    date_labels = "%Y", date_breaks = "1 year",
+    wspace = 0.25, figure_size = (16, 8),
+    title = "Forecast Plot", xlab = "Date", ylab = "Revenue"
+):
+    """
+    Plots the output of arima_forecast() with plotnine, one facet per id.
+    Sparse columns are made dense first.
+
+    Args:
+        data (DataFrame):
+            An ARIMA forecast data frame.
+        id_column (str):
+            A single column name specifying a unique identifier for the time series.
+        date_column (str):
+            A single column name specifying the date column.
+        ribbon_alpha, facet_ncol, facet_scales, date_labels, date_breaks,
+        wspace, figure_size, title, xlab, ylab:
+            Plot formatting options.
+
+    Returns:
+        ggplot: A plotnine plot.
+    """
+
+    required_columns = [id_column, date_column, 'value', 'predictions', 'ci_low', 'ci_high']
+
+    # Data Wrangling
+    df_prepped = data.loc[:, required_columns].copy()
+
+    for col in required_columns:
+        if isinstance(df_prepped[col].dtype, pd.SparseDtype):
+            df_prepped[col] = df_prepped[col].sparse.to_dense()
+
+    df_prepped = df_prepped \
+        .melt(
+            value_vars = ['value', 'predictions'],
+            id_vars    = [id_column, date_column, 'ci_low', 'ci_high'],
+            value_name = '.value'
+        ) \
+        .rename({'.value': 'value'}, axis = 1)
+
+    # Handle the Categorical Conversion
+    df_prepped[id_column] = cat_reorder(
+        c         = df_prepped[id_column],
+        x         = df_prepped['value'],
+        fun       = np.mean,
+        ascending = False
+    )
+
+    # Check date_column: if period, convert to datetime64
+    if df_prepped[date_column].dtype != 'datetime64[ns]':
+        try:
+            df_prepped[date_column] = df_prepped[date_column].dt.to_timestamp()
+        except:
+            try:
+                df_prepped[date_column] = pd.to_datetime(df_prepped[date_column])
+            except:
+                raise Exception("Could not auto-convert `date_column` to datetime64.")
+
+    # Plotting
+    g = (
+        ggplot(
+            mapping = aes(x = date_column, y = "value", color = "variable"),
+            data    = df_prepped
+        )
+
+        # Geometries
+        + geom_ribbon(aes(ymin = "ci_low", ymax = "ci_high"), alpha = ribbon_alpha, color = None)
+        + geom_line()
+
+        # Facets
+        + facet_wrap(id_column, ncol = facet_ncol, scales = facet_scales)
+
+        # Scales
+        + scale_x_datetime(date_labels = date_labels, date_breaks = date_breaks)
+        + scale_y_continuous(labels = dollar_format(big_mark = ",", digits = 0))
+        + scale_color_manual(values = ["red", "#2C3E50"])
+
+        # Theme & Labels
+        + theme_minimal()
+        + theme(
+            legend_position = "none",
+            subplots_adjust = {'wspace': wspace},
+            figure_size     = figure_size
+        )
+        + labs(title = title, x = xlab, y = ylab)
+    )
+
+    return g
@@ -0,0 +1,71 @@
+# IMPORTS ----
+
+import os
+import pathlib
+
+import pandas as pd
+
+
+# REPORT DATA ----
+
+REPORT_DATA_SUFFIXES = {
+    "pickle"  : ".pkl",
+    "parquet" : ".parquet",
+    "feather" : ".feather"
+}
+
+def write_report_data(data, path):
+    """
+    Writes the data shared by every report to `path`. The format follows
+    the suffix (.pkl, .parquet or .feather). The file is written to a
+    temporary file first, so reports never read a partial file.
+    """
+
+    path = pathlib.Path(path)
+    path.parent.mkdir(parents = True, exist_ok = True)
+
+    tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp{path.suffix}")
+
+    if path.suffix == ".parquet":
+        data.to_parquet(tmp_path, index = False)
+    elif path.suffix == ".feather":
+        data.reset_index(drop = True).to_feather(tmp_path)
+    elif path.suffix == ".pkl":
+        data.to_pickle(tmp_path)
+    else:
+        raise ValueError("`path` must end in .pkl, .parquet or .feather.")
+
+    os.replace(tmp_path, path)
+
+def read_report_data(data_path, ids = None, id_column = "id"):
+    """
+    Reads a report data file written by run_reports().
+
+    Args:
+        data_path (str): Path of the .pkl, .parquet or .feather file.
+        ids (list, optional): 
+            Only the rows with these ids are returned. Parquet files are
+            filtered while reading. Defaults to None (all rows).
+        id_column (str, optional): The id column. Defaults to "id".
+
+    Returns:
+        DataFrame: The report data.
+    """
+
+    data_path = pathlib.Path(data_path)
+
+    if data_path.suffix == ".parquet":
+        filters = None if ids is None else [(id_column, "in", list(ids))]
+        return pd.read_parquet(data_path, filters = filters)
+
+    if data_path.suffix == ".feather":
+        df = pd.read_feather(data_path)
+    elif data_path.suffix == ".pkl":
+        df = pd.read_pickle(data_path)
+    else:
+        raise ValueError("`data_path` must end in .pkl, .parquet or .feather.")
+
+    if ids is not None:
+        df = df[df[id_column].isin(ids)].reset_index(drop = True)
+
+    return df
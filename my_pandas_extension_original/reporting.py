@@ -0,0 +1,670 @@
+# IMPORTS ----
+
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+import atexit
+import hashlib
+import pathlib
+import os
+import queue
+import string
+import threading
+
+import pandas as pd
+
+import nbformat
+import papermill as pm
+from jupyter_client.manager import AsyncKernelManager
+from nbconvert.exporters import HTMLExporter, PDFExporter
+from nbconvert.writers import FilesWriter
+from traitlets.config import Config
+from jupyter_core.utils import run_sync
+from traitlets import Unicode
+
+# Kept in a module without the Jupyter imports, so report kernels can
+# read the data without importing papermill and nbconvert
+from my_pandas_extensions.report_data import (
+    REPORT_DATA_SUFFIXES,
+    write_report_data,
+    read_report_data
+)
+
+
+# PATHS ----
+
+def get_template_path(path = './09_jupyter_papermill/template/01_jupyter_analysis_template.ipynb'):
+    return pathlib.Path(path)
+
+def get_report_file_name(report_title):
+    """
+    Makes a file name from a report title: punctuation removed, lower case,
+    spaces replaced by underscores.
+    """
+
+    file_name = report_title \
+        .translate(
+            str.maketrans('', '', string.punctuation)
+        ) \
+        .lower() \
+        .replace(" ", "_")
+
+    return file_name
+
+
+# RUN REPORTS ----
+
+def run_reports(
+    data, id_sets = None,
+    report_titles = None,
+    directory = "reports/",
+    max_workers = 1,
+    data_format = "json",
+    warm_kernels = False,
+    force = False,
+    convert_to_html = False,
+    convert_to_pdf = False
+):
+    """
+    Makes one parameterized Jupyter report per id set by executing the
+    template notebook with papermill.
+
+    Args:
+        data (DataFrame):
+            A forecast data frame, e.g. from read_forecast_from_database().
+        id_sets (list):
+            A list of lists of ids. One report is made per list.
+        report_titles (list):
+            One title per id set. Also used to name the output notebooks.
+        directory (str, optional):
+            Output directory for the reports. Created if needed.
+            Defaults to "reports/".
+        max_workers (int, optional):
+            Number of reports executed at the same time, each in its own
+            worker process with its own Jupyter kernel. 1 executes the
+            reports one after another in this process, -1 uses all CPUs.
+            Defaults to 1.
+        data_format (str, optional):
+            How `data` is passed to the reports. "json" passes the whole
+            frame as a JSON string parameter to every report. "pickle",
+            "parquet" or "feather" write the frame once to a shared file in
+            `directory`, and only its path and the ids are passed; each
+            report loads its own rows with read_report_data(). Parquet
+            files are filtered while reading. Pickle and Feather keep every
+            dtype. Defaults to "json".
+        warm_kernels (bool, optional):
+            If True, reports run in a pool of `max_workers` kernels that
+            are kept for the life of the process, with pandas, plotnine and
+            my_pandas_extensions already imported (see get_kernel_pool()).
+            The kernel namespace is reset after each report. Later calls
+            reuse the same kernels, so per-report start-up time is mostly
+            avoided. Defaults to False (a new kernel per report).
+        force (bool, optional):
+            Each finished report records a fingerprint of the template, its
+            parameters and its rows of `data` in the notebook metadata.
+            Reports whose fingerprint matches the existing output are
+            skipped, unless `force` is True. Defaults to False.
+        convert_to_html (bool, optional):
+            If True, each report is also exported to HTML in
+            `directory` + "_html", without the code cells. Defaults to False.
+        convert_to_pdf (bool, optional):
+            If True, each report is also exported to PDF (requires LaTeX)
+            in `directory` + "_pdf". Defaults to False.
+
+            Exports run after all reports are executed, in a pool of
+            `max_workers` processes. Each worker makes its exporters once
+            and reuses them for every file. Reports whose exported files
+            are newer than the notebook aren't exported again.
+
+    Returns:
+        DataFrame: One row per report with the "title", "output_path",
+        "skipped" (True if the output was already up to date), "error"
+        (None if the report succeeded) and "convert_error" (None if the
+        HTML/PDF exports succeeded). A failing report doesn't stop the
+        others.
+
+    See also:
+        - my_pandas_extensions.database.read_forecast_from_database()
+    """
+
+    # Checks
+    if len(id_sets) != len(report_titles):
+        raise ValueError("`id_sets` and `report_titles` must have the same length.")
+
+    if type(max_workers) is not int or max_workers == 0 or max_workers < -1:
+        raise ValueError("`max_workers` must be a positive integer or -1.")
+
+    if data_format not in ["json", *REPORT_DATA_SUFFIXES.keys()]:
+        raise ValueError(
+            "`data_format` must be one of 'json', 'pickle', 'parquet' or 'feather'."
+        )
+
+    # Make the directory if not created
+    dir_path = pathlib.Path(directory)
+    directory_exists = os.path.isdir(dir_path)
+    if not directory_exists:
+        print(f"Making directory at {str(dir_path.absolute())}")
+        os.makedirs(dir_path)
+
+    # Papermill Jobs
+    input_path = get_template_path()
+
+    jobs = []
+    for id_set, report_title in zip(id_sets, report_titles):
+
+        output_path = dir_path / f"{get_report_file_name(report_title)}.ipynb"
+
+        params = {
+            "ids"   : list(id_set),
+            "title" : report_title
+        }
+
+        jobs.append(dict(
+            input_path  = input_path,
+            output_path = output_path,
+            parameters  = params
+        ))
+
+    # Skip Unchanged Reports
+    fingerprints = get_report_fingerprints(
+        data, input_path, [job["parameters"] for job in jobs]
+    )
+
+    skipped = [
+        not force and get_saved_report_fingerprint(job["output_path"]) == fingerprint
+        for job, fingerprint in zip(jobs, fingerprints)
+    ]
+
+    run_index = [i for i in range(len(jobs)) if not skipped[i]]
+
+    if len(run_index) < len(jobs):
+        print(f"Skipping {len(jobs) - len(run_index)} unchanged reports.")
+
+    # Data is sent once: as JSON, or as the path of a shared file
+    if len(run_index) > 0:
+        if data_format == "json":
+            data_params = {"data": data.to_json()}
+        else:
+            data_path = dir_path.absolute() / f"report_data{REPORT_DATA_SUFFIXES[data_format]}"
+            write_report_data(data, data_path)
+            data_params = {"data_path": str(data_path)}
+
+        for i in run_index:
+            jobs[i]["parameters"].update(data_params)
+
+    # Papermill Execute
+    errors = {i: None for i in range(len(jobs))}
+
+    if len(run_index) == 0:
+        pass
+
+    elif max_workers == 1 and not warm_kernels:
+        for i in run_index:
+            errors[i] = execute_report(**jobs[i])
+
+    else:
+        if warm_kernels:
+            # Kernels run in their own processes, the pool's threads only
+            # wait on them
+            n_kernels = (os.cpu_count() or 1) if max_workers == -1 else max_workers
+            kernel_pool = get_kernel_pool(n_kernels)
+
+            futures = {
+                kernel_pool["executor"].submit(execute_warm_report, kernel_pool["idle"], **jobs[i]): i
+                for i in run_index
+            }
+
+            errors.update(collect_report_errors(futures))
+
+        else:
+            max_workers = None if max_workers == -1 else max_workers
+
+            with ProcessPoolExecutor(max_workers = max_workers) as executor:
+                futures = {
+                    executor.submit(execute_report, **jobs[i]): i
+                    for i in run_index
+                }
+
+                errors.update(collect_report_errors(futures))
+
+    # Record fingerprints of the reports that succeeded
+    for i in run_index:
+        if errors[i] is None:
+            save_report_fingerprint(jobs[i]["output_path"], fingerprints[i])
+
+    # NBConvert: HTML & PDF
+    formats = [
+        fmt for fmt, convert in [("html", convert_to_html), ("pdf", convert_to_pdf)]
+        if convert
+    ]
+
+    convert_errors = {i: None for i in range(len(jobs))}
+
+    convert_index = [
+        i for i in range(len(jobs))
+        if errors[i] is None and len(formats) > 0
+        and needs_conversion(jobs[i]["output_path"], formats)
+    ]
+
+    if len(convert_index) == 0:
+        pass
+
+    elif max_workers == 1:
+        for i in convert_index:
+            convert_errors[i] = convert_report(jobs[i]["output_path"], formats)
+
+    else:
+        convert_workers = None if max_workers == -1 else max_workers
+
+        with ProcessPoolExecutor(max_workers = convert_workers) as executor:
+            futures = {
+                executor.submit(convert_report, jobs[i]["output_path"], formats): i
+                for i in convert_index
+            }
+
+            convert_errors.update(collect_report_errors(futures))
+
+    # Report Summary
+    ret = pd.DataFrame({
+        "title"         : list(report_titles),
+        "output_path"   : [str(job["output_path"]) for job in jobs],
+        "skipped"       : skipped,
+        "error"         : [errors[i] for i in range(len(jobs))],
+        "convert_error" : [convert_errors[i] for i in range(len(jobs))]
+    })
+
+    for error_col, label in [("error", "reports failed"), ("convert_error", "exports failed")]:
+        n_failed = ret[error_col].notna().sum()
+        if n_failed > 0:
+            print(f"{n_failed} of {len(ret)} {label}:")
+            for _, row in ret[ret[error_col].notna()].iterrows():
+                print(f"  {row['title']}: {row[error_col]}")
+
+    return ret
+
+
+# REPORT FINGERPRINTS ----
+
+def get_report_fingerprints(data, input_path, parameters_list, id_column = "id"):
+    """
+    Hashes, for each report, the template file, the report parameters and
+    the rows of `data` whose id is in the report's ids. Rows are hashed
+    once and only their hashes are filtered per report.
+    """
+
+    template_hash = hashlib.sha256(pathlib.Path(input_path).read_bytes()).hexdigest()
+
+    row_hashes = pd.util.hash_pandas_object(data, index = False).values
+    ids        = data[id_column]
+    layout     = repr([list(data.columns), list(data.dtypes.astype(str))])
+
+    fingerprints = []
+    for parameters in parameters_list:
+        hasher = hashlib.sha256()
+        hasher.update(template_hash.encode())
+        hasher.update(repr(sorted(parameters.items())).encode())
+        hasher.update(layout.encode())
+        hasher.update(row_hashes[ids.isin(parameters["ids"]).values].tobytes())
+        fingerprints.append(hasher.hexdigest())
+
+    return fingerprints
+
+def get_saved_report_fingerprint(output_path):
+    """
+    Returns the fingerprint recorded in an output notebook, or None.
+    """
+
+    try:
+        nb = nbformat.read(str(output_path), as_version = 4)
+    except (OSError, ValueError):
+        return None
+
+    return nb.metadata.get("report_fingerprint")
+
+def save_report_fingerprint(output_path, fingerprint):
+    """
+    Records a fingerprint in the metadata of an output notebook.
+    """
+
+    nb = nbformat.read(str(output_path), as_version = 4)
+    nb.metadata["report_fingerprint"] = fingerprint
+    nbformat.write(nb, str(output_path))
+
+
+# EXECUTE ----
+
+def collect_report_errors(futures):
+    """
+    Waits for report futures (mapped to their position) and returns the
+    error of each: None, or a message.
+    """
+
+    errors = {}
+
+    for future in as_completed(futures):
+        i = futures[future]
+        try:
+            errors[i] = future.result()
+        except Exception as e:
+            # e.g. a worker process that died
+            errors[i] = f"{type(e).__name__}: {e}"
+
+    return errors
+
+def execute_report(input_path, output_path, parameters, km = None):
+    """
+    Executes one report with papermill, in a new kernel or in the running
+    kernel of `km`. Returns None on success, or the error message, so that
+    one failing report doesn't stop the others.
+
+    Defined at module level so it can be sent to worker processes.
+    """
+
+    try:
+        pm.execute_notebook(
+            input_path  = input_path,
+            output_path = output_path,
+            parameters  = parameters,
+            report_mode = True,
+            km          = km
+        )
+    except Exception as e:
+        return f"{type(e).__name__}: {e}"
+
+    return None
+
+def execute_warm_report(kernel_pool, input_path, output_path, parameters):
+    """
+    Executes one report in a kernel borrowed from `kernel_pool`, then resets
+    the kernel and returns it to the pool.
+    """
+
+    km = kernel_pool.get()
+
+    try:
+        error = execute_report(input_path, output_path, parameters, km = km)
+        km.stop_clients()
+        reset_warm_kernel(km)
+    finally:
+        kernel_pool.put(km)
+
+    return error
+
+
+
+# CONVERT REPORTS ----
+
+CONVERT_SUFFIXES = {
+    "html" : ".html",
+    "pdf"  : ".pdf"
+}
+
+# Exporters and writers, made once per process by get_exporter() and
+# get_files_writer() and reused for every converted file
+CONVERT_STATE = {"exporters": {}, "writers": {}}
+
+def get_nbconvert_config():
+    """
+    NBConvert configuration for reports: code cells are hidden, and cells
+    tagged "remove_cell", "remove_output" or "remove_input" are removed.
+    See https://nbconvert.readthedocs.io/en/latest/removing_cells.html
+    """
+
+    c = Config()
+
+    c.TemplateExporter.exclude_input = True
+    c.TagRemovePreprocessor.remove_cell_tags = ("remove_cell",)
+    c.TagRemovePreprocessor.remove_all_outputs_tags = ("remove_output",)
+    c.TagRemovePreprocessor.remove_input_tags = ("remove_input",)
+    c.TagRemovePreprocessor.enabled = True
+
+    c.HTMLExporter.preprocessors = ["nbconvert.preprocessors.TagRemovePreprocessor"]
+    c.PDFExporter.preprocessors  = ["nbconvert.preprocessors.TagRemovePreprocessor"]
+
+    return c
+
+def get_exporter(fmt):
+    """
+    Returns this process' exporter for "html" or "pdf", making it on first use.
+    """
+
+    exporter = CONVERT_STATE["exporters"].get(fmt)
+
+    if exporter is None:
+        exporter_class = {"html": HTMLExporter, "pdf": PDFExporter}[fmt]
+        exporter = exporter_class(config = get_nbconvert_config())
+        CONVERT_STATE["exporters"][fmt] = exporter
+
+    return exporter
+
+def get_files_writer(build_directory):
+    """
+    Returns this process' FilesWriter for a directory, making it on first use.
+    """
+
+    writer = CONVERT_STATE["writers"].get(build_directory)
+
+    if writer is None:
+        writer = FilesWriter(build_directory = build_directory)
+        CONVERT_STATE["writers"][build_directory] = writer
+
+    return writer
+
+def get_converted_path(notebook_path, fmt):
+    """
+    The exported file of a report: "reports/x.ipynb" -> "reports_html/x.html".
+    """
+
+    notebook_path = pathlib.Path(notebook_path)
+
+    return pathlib.Path(f"{notebook_path.parent}_{fmt}") \
+        / f"{notebook_path.stem}{CONVERT_SUFFIXES[fmt]}"
+
+def needs_conversion(notebook_path, formats):
+    """
+    True if any exported file is missing or older than the notebook.
+    """
+
+    notebook_mtime = os.path.getmtime(notebook_path)
+
+    for fmt in formats:
+        converted_path = get_converted_path(notebook_path, fmt)
+        if not converted_path.exists() or os.path.getmtime(converted_path) < notebook_mtime:
+            return True
+
+    return False
+
+def convert_report(notebook_path, formats):
+    """
+    Exports one report notebook to each format ("html", "pdf"). Returns
+    None on success, or the error messages.
+
+    Defined at module level so it can be sent to worker processes.
+    """
+
+    notebook_path = pathlib.Path(notebook_path)
+
+    errors = []
+    for fmt in formats:
+        try:
+            (body, resources) = get_exporter(fmt).from_filename(str(notebook_path))
+
+            build_directory = str(get_converted_path(notebook_path, fmt).parent)
+
+            get_files_writer(build_directory) \
+                .write(body, resources, notebook_name = notebook_path.stem)
+        except Exception as e:
+            errors.append(f"{fmt}: {type(e).__name__}: {e}")
+
+    if len(errors) > 0:
+        return "; ".join(errors)
+
+    return None
+
+
+# WARM KERNELS ----
+
+# Run once in every pooled kernel. Names are cleared between reports, but
+# the imported modules stay loaded, so the template's imports are instant.
+WARM_UP_CODE = """
+import importlib
+for module_name in [
+    "pandas", "numpy", "plotnine", "mizani.formatters",
+    "my_pandas_extensions.database",
+    "my_pandas_extensions.forecasting",
+    "my_pandas_extensions.report_data"
+]:
+    try:
+        importlib.import_module(module_name)
+    except ImportError:
+        pass
+"""
+
+# One pool of warm kernels per kernel name, shared by every run_reports()
+# call in the process. See get_kernel_pool() and shutdown_kernel_pools().
+KERNEL_POOLS = {}
+
+KERNEL_POOLS_LOCK = threading.Lock()
+
+class WarmKernelManager(AsyncKernelManager):
+    """
+    A kernel manager for pooled kernels. It keeps the directory to restore
+    between reports, and the clients it makes: papermill leaves the client
+    of a kernel it doesn't own open, so they are stopped after each report.
+
+    It is async, like the managers papermill makes itself, so that a kernel
+    dying during a report is detected. Call its methods with run_sync().
+    """
+
+    warm_cwd = Unicode()
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.open_clients = []
+
+    def client(self, **kwargs):
+        kc = super().client(**kwargs)
+        self.open_clients.append(kc)
+        return kc
+
+    def stop_clients(self):
+        for kc in self.open_clients:
+            if kc.channels_running:
+                kc.stop_channels()
+        self.open_clients = []
+
+def get_kernel_pool(n_kernels, kernel_name = "python3"):
+    """
+    Returns the pool of warm kernels for `kernel_name`, starting and warming
+    kernels until it has `n_kernels`. Kernels are kept until
+    shutdown_kernel_pools() or the end of the process.
+
+    Args:
+        n_kernels (int): Minimum number of kernels in the pool.
+        kernel_name (str, optional): The Jupyter kernel. Defaults to "python3".
+
+    Returns:
+        dict: "idle", a queue of idle kernel managers (take one with get()
+        and put it back when done), "managers", every kernel manager, and
+        "executor", a thread pool with one thread per kernel. The threads
+        are kept with the kernels because papermill starts a helper thread
+        for every thread it runs in.
+    """
+
+    with KERNEL_POOLS_LOCK:
+
+        pool = KERNEL_POOLS.get(kernel_name)
+
+        if pool is None:
+            pool = {"idle": queue.Queue(), "managers": [], "executor": None, "n_threads": 0}
+            KERNEL_POOLS[kernel_name] = pool
+
+        while len(pool["managers"]) < n_kernels:
+            km = start_warm_kernel(kernel_name)
+            pool["managers"].append(km)
+            pool["idle"].put(km)
+
+        if pool["n_threads"] < len(pool["managers"]):
+            if pool["executor"] is not None:
+                pool["executor"].shutdown(wait = False)
+            pool["n_threads"] = len(pool["managers"])
+            pool["executor"] = ThreadPoolExecutor(max_workers = pool["n_threads"])
+
+    return pool
+
+def shutdown_kernel_pools():
+    """
+    Shuts down every pooled kernel and clears the pools. Registered to run
+    when the process exits.
+    """
+
+    with KERNEL_POOLS_LOCK:
+
+        for pool in KERNEL_POOLS.values():
+            pool["executor"].shutdown(wait = True)
+            for km in pool["managers"]:
+                if km.has_kernel:
+                    run_sync(km.shutdown_kernel)(now = True)
+
+        KERNEL_POOLS.clear()
+
+atexit.register(shutdown_kernel_pools)
+
+def start_warm_kernel(kernel_name = "python3"):
+    """
+    Starts a kernel in the current directory and runs WARM_UP_CODE in it.
+    """
+
+    # Directory restored by reset_warm_kernel() (templates may %cd)
+    km = WarmKernelManager(kernel_name = kernel_name, warm_cwd = os.getcwd())
+    run_sync(km.start_kernel)(cwd = km.warm_cwd)
+
+    run_in_kernel(km, WARM_UP_CODE)
+
+    return km
+
+def reset_warm_kernel(km):
+    """
+    Clears the kernel namespace and figures and restores its working
+    directory. A kernel that died or can't be reset is restarted and warmed
+    again.
+    """
+
+    reset_code = "\n".join([
+        "import os",
+        f"os.chdir({km.warm_cwd!r})",
+        "try:",
+        "    import matplotlib.pyplot",
+        "    matplotlib.pyplot.close('all')",
+        "except ImportError:",
+        "    pass",
+        "get_ipython().run_line_magic('reset', '-f')"
+    ])
+
+    try:
+        if not run_sync(km.is_alive)():
+            raise RuntimeError("Kernel is not running.")
+        run_in_kernel(km, reset_code)
+    except Exception:
+        run_sync(km.restart_kernel)(now = True)
+        run_in_kernel(km, WARM_UP_CODE)
+
+def run_in_kernel(km, code, timeout = 120):
+    """
+    Runs `code` in the kernel of `km` and waits for it to finish. Raises
+    RuntimeError if the code raises.
+    """
+
+    kc = km.client()
+    kc.start_channels()
+
+    try:
+        run_sync(kc.wait_for_ready)(timeout = timeout)
+        reply = run_sync(kc.execute_interactive)(
+            code, timeout = timeout, output_hook = lambda msg: None
+        )
+    finally:
+        km.stop_clients()
+
+    if reply["content"]["status"] != "ok":
+        raise RuntimeError(
+            f"Kernel code failed: {reply['content'].get('ename')}: {reply['content'].get('evalue')}"
+        )
@@ -0,0 +1,1010 @@
+# IMPORTS ----
+
+from collections import OrderedDict
+import hashlib
+import threading
+
+import pandas as pd
+import numpy as np
+import scipy.sparse
+
+import pandas_flavor as pf
+
+
+# SUMMARIZE BY TIME ----
+@pf.register_dataframe_method
+def summarize_by_time(
+    data, date_column, value_column,
+    groups = None,
+    rule = "D",
+    agg_func = np.sum,
+    kind = "timestamp",
+    wide_format = True,
+    fillna = 0,
+    group_sets = None,
+    memoize = True,
+    *args,
+    **kwargs
+):
+    """
+    Applies one or more aggregation functions by a Pandas Period
+    or TimeStamp to one or more numeric columns.
+
+    Several summaries of the same data can be made in one call by passing
+    a list of rules and/or a list of `group_sets`. A dictionary of data
+    frames is then returned. With a sum aggregation and kind = "period",
+    the finest rule is aggregated once by the union of all group columns,
+    and every other combination is rolled up from that result.
+
+    With kind = "period", a sum or mean of a single integer value column is
+    computed with integer bin codes and np.bincount() instead of resample().
+    The result is identical.
+
+    If `data` is a rollup cube (see build_rollup_cube()), sums and means
+    are answered from its daily totals, which gives the same result as
+    summarizing the orderlines it was built from.
+
+    With wide_format = "sparse" and kind = "period", the wide result has
+    SparseDtype columns (fill value 0) built from the observed group and
+    period bins, so the mostly-zero dense frame of many groups at a fine
+    rule is never created. Its values equal the wide_format = True result
+    with fillna = 0.
+
+    Results can be memoized in memory with set_summary_cache(). Repeated
+    calls with the same arguments on data with the same content then return
+    a copy of the earlier result.
+
+    Args:
+        data (DataFrame):
+            A pandas DataFrame with a date column and value column.
+        date_column (str):
+            The name of a single data or datetime column to be aggregated by.
+            Must be datetime64.
+        value_column (str, list):
+            The name of one or more value columns to be aggregated by.
+        groups (str, list, None):
+            One or more column names representing groups to aggregate by.
+            Defaults to None.
+        rule (str, list, optional):
+            A pandas frequency (offset) such as "D" for Daily
+            or "MS" for Month Start, or a list of them.
+            Defaults to "D".
+        agg_func (function, list, optional):
+            One or more aggregating function such as np.sum.
+            Defaults to np.sum.
+        kind (str, optional):
+            One of "timestamp" or "period".
+            Defaults to "timestamp".
+        wide_format (bool, str, optional):
+            Whether or not to return "wide" or "long" format. Use "sparse"
+            for a wide format with sparse columns (requires kind = "period"
+            and fillna = 0). Defaults to True.
+        fillna (int, optional):
+            Value to fill in missing data. Defaults to 0.
+            If missing values are desired, use np.nan.
+        group_sets (list, optional):
+            A list of `groups` values (each None, a column name or a list of
+            column names) to summarize by in the same call. Replaces `groups`.
+            Defaults to None.
+        memoize (bool, optional):
+            Whether to use the summary cache, if it was enabled with
+            set_summary_cache(). Defaults to True.
+        *args, **kwargs:
+            Arguments passed to pd.DataFrame.agg()
+
+    Returns:
+        DataFrame: A data frame that is summarized by time.
+
+        dict: If `rule` is a list or `group_sets` is used, a dictionary of
+        data frames. Keys are the rule, the groups, or (groups, rule) when
+        both vary. List groups become tuples.
+    """
+
+    # Checks
+    if type(data) is not pd.DataFrame:
+        raise TypeError("`data` is not Pandas DataFrame")
+
+    if type(value_column) is not list:
+        value_column = [value_column]
+
+    # Handle Memoization
+    if memoize and SUMMARY_CACHE_SETTINGS["max_mb"] > 0:
+        cache_key = get_summary_cache_key(
+            data, date_column, value_column, groups, rule, agg_func, kind,
+            wide_format, fillna, group_sets, args, kwargs
+        )
+        if cache_key is not None:
+            ret = load_cached_summary(cache_key)
+            if ret is None:
+                ret = summarize_by_time(
+                    data, date_column, value_column,
+                    groups      = groups,
+                    rule        = rule,
+                    agg_func    = agg_func,
+                    kind        = kind,
+                    wide_format = wide_format,
+                    fillna      = fillna,
+                    group_sets  = group_sets,
+                    memoize     = False,
+                    *args,
+                    **kwargs
+                )
+                save_cached_summary(cache_key, ret)
+            return copy_summary(ret)
+
+    # Handle Rollup Cube
+    cube_attrs = data.attrs.get("rollup_cube")
+    if cube_attrs is not None:
+        return summarize_rollup_cube(
+            data, date_column, value_column,
+            groups      = groups,
+            rule        = rule,
+            agg_func    = agg_func,
+            kind        = kind,
+            wide_format = wide_format,
+            fillna      = fillna,
+            group_sets  = group_sets,
+            *args,
+            **kwargs
+        )
+
+    # Handle Multiple Summaries
+    if type(rule) is list or group_sets is not None:
+        return summarize_by_time_multi(
+            data, date_column, value_column,
+            group_sets  = [groups] if group_sets is None else group_sets,
+            rules       = rule if type(rule) is list else [rule],
+            agg_func    = agg_func,
+            kind        = kind,
+            wide_format = wide_format,
+            fillna      = fillna,
+            key_by_rule   = type(rule) is list,
+            key_by_groups = group_sets is not None,
+            *args,
+            **kwargs
+        )
+
+    # Handle Sparse Output
+    if wide_format == "sparse":
+        if kind != "period":
+            raise ValueError('`wide_format = "sparse"` requires `kind = "period"`.')
+        return summarize_by_time_sparse(
+            data, date_column, value_column,
+            groups   = groups,
+            rule     = rule,
+            agg_func = agg_func,
+            fillna   = fillna,
+            *args,
+            **kwargs
+        )
+
+    # Handle Fast Path
+    if kind == "period" and len(args) == 0 and len(kwargs) == 0:
+        fast_df = summarize_by_time_fast(
+            data, date_column, value_column,
+            groups      = groups,
+            rule        = rule,
+            agg_func    = agg_func,
+            wide_format = wide_format,
+            fillna      = fillna
+        )
+        if fast_df is not None:
+            return fast_df
+
+    # Body
+
+    # Handle Date Column
+    data = data.set_index(date_column)
+
+    # Handle Group By
+    if groups is not None:
+        data = data.groupby(groups)
+
+    # Handle Resample
+    data = data.resample(
+        rule = rule,
+        kind = kind
+    )
+
+    # Handle Aggregation
+    function_list = [agg_func] * len(value_column)
+    agg_dict      = dict(zip(value_column, function_list))
+
+    data = data.agg(
+        func = agg_dict,
+        *args,
+        **kwargs
+    )
+
+    # Handle Pivot Wider
+    if wide_format:
+        if groups is not None:
+            data = data.unstack(groups)
+            if kind == 'period' and not isinstance(data.index, pd.PeriodIndex):
+                data.index = data.index.to_period()
+
+    # Handle NA value by filling
+    data = data.fillna(value = fillna)
+
+    return data
+
+def summarize_by_time_fast(
+    data, date_column, value_column, groups, rule, agg_func, wide_format, fillna
+):
+    """
+    Sums or means a single int64 value column by period using integer bin
+    codes and np.bincount(). Returns the same data frame as the resample()
+    path of summarize_by_time(kind = "period"), or None when the inputs
+    aren't supported and resample() should be used instead.
+    """
+
+    # Checks
+    if agg_func in [np.sum, sum, "sum"]:
+        agg_name = "sum"
+    elif agg_func in [np.mean, "mean"]:
+        agg_name = "mean"
+    else:
+        return None
+
+    if len(value_column) != 1 or data[value_column[0]].dtype != np.int64:
+        return None
+
+    groups_list = [] if groups is None \
+        else ([groups] if type(groups) is not list else groups)
+
+    if not pd.api.types.is_datetime64_dtype(data[date_column]):
+        return None
+
+    for col in groups_list:
+        if isinstance(data[col].dtype, pd.CategoricalDtype):
+            return None
+
+    try:
+        periods = data[date_column].dt.to_period(rule)
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+    # Integer Codes
+    keep = periods.notna().to_numpy()
+
+    group_codes = []
+    group_keys  = []
+    for col in groups_list:
+        codes, uniques = pd.factorize(data[col], sort = True)
+        keep &= codes >= 0
+        group_codes.append(codes)
+        group_keys.append(uniques)
+
+    if not keep.any():
+        return None
+
+    values = data[value_column[0]].to_numpy()[keep]
+
+    # Float weights are only exact below 2**53
+    if np.abs(values).sum(dtype = np.float64) >= 2 ** 53:
+        return None
+
+    ordinals  = periods.array.asi8[keep]
+    first     = ordinals.min()
+    n_periods = ordinals.max() - first + 1
+
+    if len(groups_list) > 0:
+        # One code per combination of groups, in sorted order
+        shape = [len(keys) for keys in group_keys]
+        if np.prod(shape, dtype = np.float64) >= 2 ** 62:
+            return None
+
+        combined = np.ravel_multi_index(
+            [codes[keep] for codes in group_codes], shape
+        )
+        observed, group_index = np.unique(combined, return_inverse = True)
+        observed_codes = np.unravel_index(observed, shape)
+        group_index    = group_index.reshape(-1)
+        n_groups       = len(observed)
+    else:
+        group_index = np.zeros(len(ordinals), dtype = np.int64)
+        n_groups    = 1
+
+    # Aggregate
+    bins = group_index * n_periods + (ordinals - first)
+    size = n_groups * n_periods
+
+    counts = np.bincount(bins, minlength = size).reshape(n_groups, n_periods)
+    sums   = np.bincount(bins, weights = values, minlength = size) \
+        .reshape(n_groups, n_periods)
+
+    if agg_name == "sum":
+        result = sums
+    else:
+        with np.errstate(invalid = "ignore", divide = "ignore"):
+            result = np.where(counts > 0, sums / counts, np.nan)
+
+    # Each group covers every period from its first to its last observation
+    present  = counts > 0
+    in_range = np.maximum.accumulate(present, axis = 1) \
+        & np.maximum.accumulate(present[:, ::-1], axis = 1)[:, ::-1]
+
+    # Format
+    freq = periods.dt.freq
+    period_index = pd.period_range(
+        start   = pd.Period(ordinal = first, freq = freq),
+        periods = n_periods,
+        freq    = freq,
+        name    = date_column
+    )
+
+    def make_values(x):
+        if agg_name == "sum" and not np.isnan(x).any():
+            return x.astype(np.int64)
+        return x
+
+    if len(groups_list) == 0:
+        ret = pd.DataFrame(
+            {value_column[0]: make_values(result[0])},
+            index = period_index
+        )
+
+    elif wide_format:
+        wide_values = np.where(in_range, result, np.nan).T
+        keep_rows   = in_range.any(axis = 0)
+        columns = pd.MultiIndex.from_arrays(
+            [
+                [value_column[0]] * n_groups,
+                *[keys[codes] for keys, codes in zip(group_keys, observed_codes)]
+            ],
+            names = [None, *groups_list]
+        )
+        ret = pd.DataFrame(
+            make_values(wide_values[keep_rows]),
+            index   = period_index[keep_rows],
+            columns = columns
+        )
+
+    else:
+        row_groups, row_periods = np.nonzero(in_range)
+        index = pd.MultiIndex.from_arrays(
+            [
+                *[keys[codes[row_groups]] for keys, codes in zip(group_keys, observed_codes)],
+                period_index[row_periods]
+            ],
+            names = [*groups_list, date_column]
+        )
+        ret = pd.DataFrame(
+            {value_column[0]: make_values(result[row_groups, row_periods])},
+            index = index
+        )
+
+    # Handle NA value by filling
+    ret = ret.fillna(value = fillna)
+
+    return ret
+
+def summarize_by_time_sparse(
+    data, date_column, value_column, groups, rule, agg_func, fillna,
+    *args, **kwargs
+):
+    """
+    Summarizes by period into a wide data frame of SparseDtype columns with
+    a fill value of 0. Only the observed (group, period) bins are
+    aggregated and stored. Rows are the periods within any group's first
+    to last observation, like the wide_format = True result.
+    """
+
+    if fillna != 0:
+        raise ValueError('`wide_format = "sparse"` requires `fillna = 0`.')
+
+    groups_list = [] if groups is None \
+        else ([groups] if type(groups) is not list else groups)
+
+    # Observed bins only, sorted by groups then period
+    agg_dict = {col: agg_func for col in value_column}
+
+    long_df = data[[*groups_list, *value_column]] \
+        .assign(**{date_column: data[date_column].dt.to_period(rule)}) \
+        .groupby([*groups_list, date_column], observed = True) \
+        .agg(agg_dict, *args, **kwargs)
+
+    ordinals = long_df.index.get_level_values(date_column).asi8
+    freq     = long_df.index.get_level_values(date_column).freq
+
+    if len(groups_list) > 0:
+        group_index = long_df.index.droplevel(date_column)
+        group_keys  = group_index.unique()
+        group_codes = group_keys.get_indexer(group_index)
+        n_groups    = len(group_keys)
+    else:
+        group_codes = np.zeros(len(long_df), dtype = np.int64)
+        n_groups    = 1
+
+    # Rows: periods covered by at least one group's first-last range
+    first     = ordinals.min()
+    n_periods = ordinals.max() - first + 1
+
+    range_df = pd.DataFrame({"group": group_codes, "ordinal": ordinals - first}) \
+        .groupby("group")["ordinal"] \
+        .agg(["min", "max"])
+
+    coverage = np.zeros(n_periods + 1, dtype = np.int64)
+    np.add.at(coverage, range_df["min"].to_numpy(), 1)
+    np.add.at(coverage, range_df["max"].to_numpy() + 1, -1)
+    covered = np.cumsum(coverage)[:n_periods] > 0
+
+    row_position = np.cumsum(covered) - 1
+
+    period_index = pd.period_range(
+        start   = pd.Period(ordinal = first, freq = freq),
+        periods = n_periods,
+        freq    = freq,
+        name    = date_column
+    )[covered]
+
+    # One block of columns per value column, stored as (row, column, value)
+    rows_list, cols_list, vals_list = [], [], []
+    for i, col in enumerate(value_column):
+        vals = long_df[col].to_numpy()
+        keep = pd.notna(vals) & (vals != 0)
+        rows_list.append(row_position[ordinals[keep] - first])
+        cols_list.append(group_codes[keep] + i * n_groups)
+        vals_list.append(vals[keep])
+
+    coo = scipy.sparse.coo_matrix(
+        (np.concatenate(vals_list), (np.concatenate(rows_list), np.concatenate(cols_list))),
+        shape = (len(period_index), n_groups * len(value_column))
+    )
+
+    if len(groups_list) > 0:
+        columns = pd.MultiIndex.from_arrays(
+            [
+                np.repeat(value_column, n_groups),
+                *[
+                    np.tile(group_keys.get_level_values(i), len(value_column))
+                    for i in range(group_keys.nlevels)
+                ]
+            ],
+            names = [None, *groups_list]
+        )
+    else:
+        columns = pd.Index(value_column)
+
+    return pd.DataFrame.sparse.from_spmatrix(coo, index = period_index, columns = columns)
+
+def summarize_by_time_multi(
+    data, date_column, value_column, group_sets, rules,
+    agg_func = np.sum,
+    kind = "timestamp",
+    wide_format = True,
+    fillna = 0,
+    key_by_rule = True,
+    key_by_groups = True,
+    *args,
+    **kwargs
+):
+    """
+    Makes summarize_by_time() summaries for every combination of
+    `group_sets` and `rules`. See summarize_by_time().
+
+    Sums by period are computed once at the finest rule for the union of
+    the group columns, and rolled up to every other combination. Other
+    aggregations, timestamp output, or rules that do not nest inside the
+    finest rule (e.g. weeks into months) are summarized one at a time.
+    """
+
+    def make_key(groups, rule):
+        groups_key = tuple(groups) if type(groups) is list else groups
+        if key_by_rule and key_by_groups:
+            return (groups_key, rule)
+        if key_by_rule:
+            return rule
+        return groups_key
+
+    def summarize_one(groups, rule):
+        return summarize_by_time(
+            data, date_column, value_column,
+            groups      = groups,
+            rule        = rule,
+            agg_func    = agg_func,
+            kind        = kind,
+            wide_format = wide_format,
+            fillna      = fillna,
+            memoize     = False,
+            *args,
+            **kwargs
+        )
+
+    ret = {}
+
+    # Rolling up is only exact for sums of period bins
+    can_roll_up = kind == "period" \
+        and wide_format != "sparse" \
+        and agg_func in [np.sum, sum, "sum"] \
+        and len(args) == 0 and len(kwargs) == 0
+
+    if can_roll_up:
+        try:
+            base_rule = get_finest_rule(rules)
+        except ValueError:
+            can_roll_up = False
+
+    if not can_roll_up:
+        for groups in group_sets:
+            for rule in rules:
+                ret[make_key(groups, rule)] = summarize_one(groups, rule)
+        return ret
+
+    # Finest Grain, once
+    group_cols = []
+    for groups in group_sets:
+        if groups is None:
+            continue
+        for col in ([groups] if type(groups) is not list else groups):
+            if col not in group_cols:
+                group_cols.append(col)
+
+    base_df = data[[date_column, *group_cols, *value_column]] \
+        .assign(**{date_column: lambda x: x[date_column].dt.to_period(base_rule)}) \
+        .groupby([*group_cols, date_column], observed = True, sort = False) \
+        [value_column] \
+        .sum() \
+        .reset_index()
+
+    base_periods = base_df[date_column]
+
+    # Roll Up
+    for rule in rules:
+
+        rule_periods = base_periods.dt.asfreq(rule, how = "start")
+
+        # A base period that straddles two coarse periods can't be rolled up
+        nested = (rule_periods == base_periods.dt.asfreq(rule, how = "end")).all()
+
+        for groups in group_sets:
+
+            if not nested:
+                ret[make_key(groups, rule)] = summarize_one(groups, rule)
+                continue
+
+            groups_list = [] if groups is None \
+                else ([groups] if type(groups) is not list else groups)
+
+            rolled_df = base_df[[*groups_list, *value_column]] \
+                .assign(**{date_column: rule_periods}) \
+                .groupby([*groups_list, date_column], observed = True) \
+                [value_column] \
+                .sum()
+
+            ret[make_key(groups, rule)] = format_rolled_up_summary(
+                rolled_df,
+                date_column   = date_column,
+                groups        = groups,
+                groups_list   = groups_list,
+                value_dtypes  = data[value_column].dtypes,
+                wide_format   = wide_format,
+                fillna        = fillna
+            )
+
+    return ret
+
+def get_finest_rule(rules):
+    """
+    Returns the rule with the shortest period. Raises ValueError if a rule
+    is not a valid period frequency.
+    """
+
+    def period_length(rule):
+        period = pd.Period("2000-01-01", freq = rule)
+        return period.end_time - period.start_time
+
+    return min(rules, key = period_length)
+
+def format_rolled_up_summary(
+    data, date_column, groups, groups_list, value_dtypes, wide_format, fillna
+):
+    """
+    Reshapes a rolled-up (groups..., period) sum into the same layout as
+    summarize_by_time(kind = "period"): each group covers every period from
+    its first to its last observation, with empty periods summing to zero.
+    """
+
+    # One column per (value, group), one row per period of the full range
+    if len(groups_list) > 0:
+        wide_df = data.unstack(groups_list)
+    else:
+        wide_df = data
+
+    full_range = pd.period_range(
+        wide_df.index.min(), wide_df.index.max(), freq = wide_df.index.freq,
+        name = date_column
+    )
+    wide_df = wide_df.reindex(full_range)
+
+    # Zero inside each group's first-last range, missing outside
+    observed = wide_df.notna()
+    in_range = observed.cummax() & observed[::-1].cummax()[::-1]
+    wide_df  = wide_df.fillna(0).where(in_range)
+
+    # Periods outside every group's range are dropped, like resample()
+    wide_df = wide_df[in_range.any(axis = 1)]
+
+    if wide_format or len(groups_list) == 0:
+        ret = wide_df
+    else:
+        ret = wide_df \
+            .stack(groups_list) \
+            .dropna(how = "all") \
+            .reorder_levels([*groups_list, date_column]) \
+            .sort_index()
+        ret = ret[list(value_dtypes.index)]
+
+    # unstack() makes every column float when any group is missing a period
+    keep_float = wide_format and len(groups_list) > 0 and not in_range.all().all()
+
+    ret = ret.fillna(value = fillna)
+
+    # Otherwise restore the input dtypes, like resample().sum()
+    if not keep_float:
+        for col in ret.columns:
+            value_col = col[0] if type(col) is tuple else col
+            dtype = value_dtypes[value_col]
+            if ret[col].dtype != dtype and ret[col].notna().all():
+                ret[col] = ret[col].astype(dtype)
+
+    return ret
+
+
+# ROLLUP CUBE ----
+
+# Columns that build_rollup_cube() keeps as cube dimensions by default
+ROLLUP_CUBE_DIMENSIONS = [
+    "category_1", "category_2", "bikeshop_name", "city", "state"
+]
+
+@pf.register_dataframe_method
+def build_rollup_cube(
+    data,
+    date_column = "order_date",
+    value_column = "total_price",
+    dimensions = ROLLUP_CUBE_DIMENSIONS
+):
+    """
+    Pre-aggregates data to daily totals for every combination of the
+    dimension columns. summarize_by_time() answers sums and means from the
+    cube when the groups are a subset of the dimensions, without scanning
+    every row of the original data.
+
+    Args:
+        data (DataFrame):
+            A pandas DataFrame such as the output of collect_data().
+        date_column (str, optional):
+            A datetime64 column. Defaults to "order_date".
+        value_column (str, list, optional):
+            One or more numeric columns to total. Defaults to "total_price".
+        dimensions (list, optional):
+            Columns to keep as cube dimensions. Columns missing from `data`
+            are skipped. Defaults to ROLLUP_CUBE_DIMENSIONS.
+
+    Returns:
+        DataFrame: One row per day and combination of dimensions, with the
+        sum and non-missing count ("<value_column>_count") of each value
+        column.
+
+    See also:
+        - as_rollup_cube()
+        - my_pandas_extensions.database.write_rollup_cube_to_database()
+    """
+
+    if type(data) is not pd.DataFrame:
+        raise TypeError("`data` is not Pandas DataFrame")
+
+    if type(value_column) is not list:
+        value_column = [value_column]
+
+    dimensions = [col for col in dimensions if col in data.columns]
+
+    agg_dict = {}
+    for col in value_column:
+        agg_dict[col]            = (col, "sum")
+        agg_dict[f"{col}_count"] = (col, "count")
+
+    # Missing dimension values are kept so that summaries that don't group
+    # by that dimension still include those rows
+    cube = data[[date_column, *dimensions, *value_column]] \
+        .assign(**{date_column: lambda x: x[date_column].dt.normalize()}) \
+        .groupby(
+            [date_column, *dimensions], dropna = False, observed = True
+        ) \
+        .agg(**agg_dict) \
+        .reset_index()
+
+    return as_rollup_cube(
+        cube,
+        date_column  = date_column,
+        value_column = value_column,
+        dimensions   = dimensions
+    )
+
+def as_rollup_cube(
+    data,
+    date_column = "order_date",
+    value_column = "total_price",
+    dimensions = ROLLUP_CUBE_DIMENSIONS
+):
+    """
+    Marks a data frame made by build_rollup_cube() (e.g. after reading it
+    back from a database) as a rollup cube, by storing its layout in
+    `data.attrs["rollup_cube"]`.
+
+    Returns:
+        DataFrame: `data`, with the attribute set.
+    """
+
+    if type(value_column) is not list:
+        value_column = [value_column]
+
+    dimensions = [col for col in dimensions if col in data.columns]
+
+    data.attrs["rollup_cube"] = {
+        "date_column"   : date_column,
+        "value_columns" : value_column,
+        "dimensions"    : dimensions
+    }
+
+    return data
+
+def summarize_rollup_cube(
+    data, date_column, value_column,
+    groups = None,
+    rule = "D",
+    agg_func = np.sum,
+    kind = "timestamp",
+    wide_format = True,
+    fillna = 0,
+    group_sets = None,
+    *args,
+    **kwargs
+):
+    """
+    Answers summarize_by_time() from a rollup cube. Sums are summarized
+    directly from the daily totals. Means are the summarized totals divided
+    by the summarized counts.
+    """
+
+    cube_attrs = data.attrs["rollup_cube"]
+
+    # Checks
+    if date_column != cube_attrs["date_column"]:
+        raise ValueError(
+            f"The rollup cube is by `{cube_attrs['date_column']}`, not `{date_column}`."
+        )
+
+    for col in value_column:
+        if col not in cube_attrs["value_columns"]:
+            raise ValueError(f"The rollup cube has no totals for `{col}`.")
+
+    for groups_item in ([groups] if group_sets is None else group_sets):
+        groups_list = [] if groups_item is None \
+            else ([groups_item] if type(groups_item) is not list else groups_item)
+        for col in groups_list:
+            if col not in cube_attrs["dimensions"]:
+                raise ValueError(
+                    f"`{col}` is not a dimension of the rollup cube. "
+                    "Summarize the original data instead."
+                )
+
+    for rule_item in (rule if type(rule) is list else [rule]):
+        offset = pd.tseries.frequencies.to_offset(rule_item)
+        if isinstance(offset, pd.offsets.Tick) and offset.nanos < 24 * 3600 * 10 ** 9:
+            raise ValueError(
+                f"Rule '{rule_item}' is finer than the rollup cube's daily totals."
+            )
+
+    if agg_func in [np.sum, sum, "sum"]:
+        is_mean = False
+    elif agg_func in [np.mean, "mean"]:
+        is_mean = True
+    else:
+        raise ValueError(
+            "A rollup cube can only be summarized with a sum or mean `agg_func`."
+        )
+
+    # The cube without its attribute is summarized like any other data
+    plain_df = data.copy(deep = False)
+    plain_df.attrs = {}
+
+    def summarize_plain(columns, fill_value):
+        return summarize_by_time(
+            plain_df, date_column, columns,
+            groups      = groups,
+            rule        = rule,
+            agg_func    = np.sum,
+            kind        = kind,
+            wide_format = wide_format,
+            fillna      = fill_value,
+            group_sets  = group_sets,
+            memoize     = False,
+            *args,
+            **kwargs
+        )
+
+    if not is_mean:
+        return summarize_plain(value_column, fillna)
+
+    if wide_format == "sparse":
+        raise ValueError(
+            'Means of a rollup cube can\'t be returned with `wide_format = "sparse"`.'
+        )
+
+    # Means: totals / counts, missing where there are no values
+    sums_ret   = summarize_plain(value_column, np.nan)
+    counts_ret = summarize_plain([f"{col}_count" for col in value_column], np.nan)
+
+    def divide(sums_df, counts_df):
+        mean_list = []
+        for col in value_column:
+            col_sums   = sums_df[[col]]
+            col_counts = counts_df[[f"{col}_count"]].set_axis(col_sums.columns, axis = 1)
+            mean_list.append(col_sums / col_counts.where(col_counts > 0))
+        return pd.concat(mean_list, axis = 1).fillna(value = fillna)
+
+    if type(sums_ret) is dict:
+        return {key: divide(sums_ret[key], counts_ret[key]) for key in sums_ret}
+
+    return divide(sums_ret, counts_ret)
+
+
+# SUMMARY CACHE ----
+
+# In-memory LRU cache of summarize_by_time() results, shared by every call
+# in the process. Disabled until set_summary_cache() gives it a budget.
+SUMMARY_CACHE = OrderedDict()
+
+SUMMARY_CACHE_LOCK = threading.Lock()
+
+SUMMARY_CACHE_SETTINGS = {"max_mb": 0, "used_bytes": 0}
+
+def set_summary_cache(max_mb = 256):
+    """
+    Enables memoization of summarize_by_time() results, keeping at most
+    `max_mb` megabytes of results and evicting the least recently used
+    first.
+
+    Results are keyed by a fingerprint of the content of the columns used
+    (date, values and groups) together with every argument. Changing the
+    data, even in place, changes the key, so stale results are never
+    returned.
+
+    Args:
+        max_mb (int, optional):
+            Memory budget in megabytes. Use 0 or None to disable the cache
+            and clear it. Defaults to 256.
+
+    See also:
+        - clear_summary_cache()
+    """
+
+    with SUMMARY_CACHE_LOCK:
+        SUMMARY_CACHE_SETTINGS["max_mb"] = max_mb or 0
+        evict_cached_summaries()
+
+def clear_summary_cache():
+    """
+    Removes every memoized summarize_by_time() result.
+    """
+
+    with SUMMARY_CACHE_LOCK:
+        SUMMARY_CACHE.clear()
+        SUMMARY_CACHE_SETTINGS["used_bytes"] = 0
+
+def get_summary_cache_key(
+    data, date_column, value_column, groups, rule, agg_func, kind,
+    wide_format, fillna, group_sets, args, kwargs
+):
+    """
+    Returns the cache key of a summarize_by_time() call, or None if the
+    call can't be cached (missing columns or unhashable arguments).
+    """
+
+    columns = [date_column, *value_column]
+    for groups_item in ([groups] if group_sets is None else group_sets):
+        if groups_item is None:
+            continue
+        for col in ([groups_item] if type(groups_item) is not list else groups_item):
+            if col not in columns:
+                columns.append(col)
+
+    # Cube means are sums divided by the "<value_column>_count" columns
+    if data.attrs.get("rollup_cube") is not None:
+        columns += [
+            f"{col}_count" for col in value_column 
+            if f"{col}_count" in data.columns
+        ]
+
+    if not all(col in data.columns for col in columns):
+        return None
+
+    # Only the used columns are hashed. The row index is not used.
+    hasher = hashlib.sha256()
+    hasher.update(pd.util.hash_pandas_object(data[columns], index = False).values.tobytes())
+    hasher.update(repr(columns).encode())
+    hasher.update(repr(list(data[columns].dtypes.astype(str))).encode())
+    hasher.update(repr(data.attrs.get("rollup_cube")).encode())
+
+    arguments = repr((
+        date_column, value_column, groups, rule, kind, wide_format, fillna,
+        group_sets, args, sorted(kwargs.items())
+    ))
+
+    # The function itself is part of the key, so it can't be garbage
+    # collected and its id reused while the entry exists
+    agg_key = tuple(agg_func) if type(agg_func) is list else agg_func
+
+    key = (hasher.hexdigest(), arguments, agg_key)
+
+    try:
+        hash(key)
+    except TypeError:
+        return None
+
+    return key
+
+def load_cached_summary(key):
+    """
+    Returns the memoized result for `key`, or None on a miss.
+    """
+
+    with SUMMARY_CACHE_LOCK:
+        entry = SUMMARY_CACHE.get(key)
+        if entry is None:
+            return None
+
+        # Mark as recently used for eviction
+        SUMMARY_CACHE.move_to_end(key)
+
+        return entry[0]
+
+def save_cached_summary(key, summary):
+    """
+    Memoizes a result, then evicts the least recently used results until
+    the cache is within its budget. Results larger than the budget are not
+    kept.
+    """
+
+    if type(summary) is dict:
+        n_bytes = int(sum(df.memory_usage(deep = True).sum() for df in summary.values()))
+    else:
+        n_bytes = int(summary.memory_usage(deep = True).sum())
+
+    with SUMMARY_CACHE_LOCK:
+
+        if n_bytes > SUMMARY_CACHE_SETTINGS["max_mb"] * 1024 ** 2:
+            return
+
+        if key in SUMMARY_CACHE:
+            SUMMARY_CACHE_SETTINGS["used_bytes"] -= SUMMARY_CACHE.pop(key)[1]
+
+        SUMMARY_CACHE[key] = (copy_summary(summary), n_bytes)
+        SUMMARY_CACHE_SETTINGS["used_bytes"] += n_bytes
+
+        evict_cached_summaries()
+
+def evict_cached_summaries():
+    """
+    Drops least recently used results until the cache is within its budget.
+    Call with SUMMARY_CACHE_LOCK held.
+    """
+
+    max_bytes = SUMMARY_CACHE_SETTINGS["max_mb"] * 1024 ** 2
+
+    while len(SUMMARY_CACHE) > 0 and SUMMARY_CACHE_SETTINGS["used_bytes"] > max_bytes:
+        _, (_, n_bytes) = SUMMARY_CACHE.popitem(last = False)
+        SUMMARY_CACHE_SETTINGS["used_bytes"] -= n_bytes
+
+def copy_summary(summary):
+    """
+    Copies a summary (or dict of summaries) so that callers can't modify
+    a cached result in place.
+    """
+
+    if type(summary) is dict:
+        return {key: df.copy() for key, df in summary.items()}
+
+    return summary.copy()
@@ -3,153 +3,216 @@
 
 # IMPORTS ----
 
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
 import pandas as pd
 import numpy as np
 
 from my_pandas_extensions.database import (
     collect_data,
+    collect_data_incremental,
     write_forecast_to_database,
     read_forecast_from_database,
-    prep_forecast_data_for_update
+    prep_forecast_data_for_update,
+    write_rollup_cube_to_database,
+    migrate_forecast_table
 )
 
-from my_pandas_extensions.timeseries import summarize_by_time
-from my_pandas_extensions.forecasting import arima_forecast, plot_forecast
+from my_pandas_extensions.timeseries import summarize_by_time, build_rollup_cube
+from my_pandas_extensions.forecasting import (
+    arima_forecast,
+    plot_forecast,
+    evict_forecaster_cache,
+    evict_forecast_checkpoints
+)
 
-df = collect_data()
+# CHECKPOINTS ----
+# - Each forecast stage saves its output to checkpoint_dir and each fitted
+#   series to cache_dir. A rerun after a failure skips finished work
+#   unless its input data changed.
+# - The branches don't evict old checkpoints and cached fits themselves,
+#   since branches that finish together would evict the same folders.
+#   Eviction runs once, after every branch has finished (see 2.2).
+
+checkpoint_kwargs = dict(
+    checkpoint_dir          = "00_checkpoints/forecasts",
+    checkpoint_max_age_days = None,
+    cache_dir               = "00_checkpoints/arima_cache",
+    cache_max_mb            = None,
+    cache_max_age_days      = None
+)
 
 
-# 1.0 SUMMARIZE AND FORECAST ----
+# 1.0 FORECAST PIPELINE ----
+# - Summarize: one pass over `df` per rule, for the groups that rule needs
+# - Each branch then runs: forecast -> prep -> write
+# - Branches only share the summaries, so they run concurrently in
+#   threads, which read the same data frames without copying them.
+# - The threads only orchestrate: every AutoARIMA fit of every branch is
+#   submitted to one shared process pool, so all CPUs stay busy whatever
+#   the number of series per branch.
+
+forecast_stages = [
+    dict(
+        name      = "Total Revenue",
+        groups    = None,
+        rule      = "M",
+        h         = 12,
+        sp        = 12,
+        id_prefix = None
+    ),
+    dict(
+        name      = "Category 1",
+        groups    = "category_1",
+        rule      = "M",
+        h         = 12,
+        sp        = 12,
+        id_prefix = "Category 1: "
+    ),
+    dict(
+        name      = "Category 2",
+        groups    = "category_2",
+        rule      = "M",
+        h         = 12,
+        sp        = 12,
+        id_prefix = "Category 2: "
+    ),
+    dict(
+        name      = "Revenue by Customer",
+        groups    = "bikeshop_name",
+        rule      = "Q",
+        h         = 4,
+        sp        = 4,
+        id_prefix = "Bikeshop: "
+    )
+]
 
+def summarize_forecast_stages(df, stages):
 
-# 1.1 Total Revenue ----
+    # 1.1 Summarize ----
+    # A list of rules would make every (groups, rule) combination, so
+    # each rule is summarized only by the groups of its own stages
+    summaries = {}
+    for rule in dict.fromkeys(stage['rule'] for stage in stages):
 
-print("Forecast 1/4: Forecasting Total Revenue...\n")
+        group_sets = list(dict.fromkeys(
+            stage['groups'] for stage in stages if stage['rule'] == rule
+        ))
 
-forecast_1_df = df \
-    .summarize_by_time(
-        date_column  = "order_date",
-        value_column = "total_price",
-        rule         = "M",
-        kind         = "period"
-    ) \
-    .arima_forecast(
-        h  = 12, 
-        sp = 12
-    )
+        rule_summaries = df \
+            .summarize_by_time(
+                date_column  = "order_date",
+                value_column = "total_price",
+                group_sets   = group_sets,
+                rule         = rule,
+                kind         = "period"
+            )
 
-forecast_1_df = forecast_1_df \
-    .assign(id = "Total Revenue") \
-    .prep_forecast_data_for_update(
-        id_column   = "id",
-        date_column = "order_date"
-    )
+        for groups, summary_df in rule_summaries.items():
+            summaries[(groups, rule)] = summary_df
 
-print("Forecast 1/4: Forecasting Total Revenue Complete\n")
+    return summaries
 
+def run_forecast_stage(summaries, stage, executor):
 
+    summary_df = summaries[(stage['groups'], stage['rule'])]
 
-# 1.2 Revenue by Category 1 ----
+    # 1.2 Forecast ----
+    forecast_df = summary_df \
+        .arima_forecast(
+            h        = stage['h'],
+            sp       = stage['sp'],
+            executor = executor,
+            **checkpoint_kwargs
+        )
 
-print("Forecast 2/4: Forecasting Category 1...\n")
+    # 1.3 Prep ----
+    if stage['groups'] is None:
+        forecast_df = forecast_df \
+            .assign(id = stage['name']) \
+            .prep_forecast_data_for_update(
+                id_column   = "id",
+                date_column = "order_date"
+            )
+    else:
+        forecast_df = forecast_df \
+            .prep_forecast_data_for_update(
+                id_column   = stage['groups'],
+                date_column = "order_date"
+            ) \
+            .assign(id = lambda x: stage['id_prefix'] + x['id'])
 
-forecast_2_df = df \
-    .summarize_by_time(
-        date_column   = "order_date",
-        value_column  = "total_price",
-        groups        = "category_1", 
-        rule          = "M",
-        kind          = "period"
-    ) \
-    .arima_forecast(
-        h   = 12, 
-        sp  = 12
-    )
+    return forecast_df
+
+
+# 2.0 RUN AND UPDATE DATABASE ----
+# - The guard keeps worker processes (spawned on Windows and macOS)
+#   from re-running the pipeline when they import this script.
+
+if __name__ == "__main__":
+
+    # Older forecast tables use other column names and cannot be upserted
+    if migrate_forecast_table():
+        print("Forecast table migrated to the current columns.\n")
+
+    # Only orderlines newer than the local snapshot are fetched from the database
+    df = collect_data_incremental()
 
-forecast_2_df = forecast_2_df \
-    .prep_forecast_data_for_update(
-        id_column    = "category_1",
-        date_column  = "order_date"
-    ) \
-    .assign(id = lambda x: "Category 1: " + x['id']) 
-
-print("Forecast 2/4: Forecasting Category 1 Complete\n")
-
-# 1.3 Revenue by Category 2 ----
-
-print("Forecast 3/4: Forecasting Category 2...\n")
-
-forecast_3_df = df \
-    .summarize_by_time(
-        date_column   = "order_date",
-        value_column  = "total_price",
-        groups        = "category_2", 
-        rule          = "M",
-        kind          = "period"
-    ) \
-    .arima_forecast(
-        h   = 12, 
-        sp  = 12
+    # Daily totals by dimension. Stored for analysts (see
+    # read_rollup_cube_from_database()) and used for the summaries below.
+    cube_df = df.build_rollup_cube()
+
+    cube_df.write_rollup_cube_to_database()
+
+    summaries = summarize_forecast_stages(cube_df, forecast_stages)
+
+    # Each finished branch is written right away. Writes happen one at a
+    # time from this thread, upserting on (id, date).
+
+    n_stages = len(forecast_stages)
+
+    # Workers are spawned rather than forked, since the pool is used from
+    # the branch threads
+    fit_pool = ProcessPoolExecutor(
+        max_workers = os.cpu_count(),
+        mp_context  = multiprocessing.get_context("spawn")
     )
 
-forecast_3_df = forecast_3_df \
-    .prep_forecast_data_for_update(
-        id_column   = "category_2",
-        date_column = "order_date"
-    ) \
-    .assign(id = lambda x: "Category 2: " + x['id']) 
-
-print("Forecast 3/4: Forecasting Category 3 Complete\n")
-
-# 1.4 Revenue by Customer ----
-
-print("Forecast 4/4: Forecasting Revenue by Customer...\n")
-
-forecast_4_df = df \
-    .summarize_by_time(
-        date_column   = "order_date",
-        value_column  = "total_price",
-        groups        = "bikeshop_name", 
-        rule          = "Q",
-        kind          = "period"
-    ) \
-    .arima_forecast(
-        h   = 4,
-        sp  = 4
-    ) 
-
-forecast_4_df = forecast_4_df \
-    .prep_forecast_data_for_update(
-        id_column   = "bikeshop_name",
-        date_column = "order_date"
-    ) \
-    .assign(id = lambda x: "Bikeshop: " + x['id']) 
-
-print("Forecast 4/4: Forecasting Revenue by Customer Complete\n")
-
-# 2.0 UPDATE DATABASE ----
-
-print("Updating Database")
-
-all_forecasts_df = pd.concat(
-    [
-        forecast_1_df, 
-        forecast_2_df,
-        forecast_3_df,
-        forecast_4_df
-    ], 
-    axis = 0
-)
+    with fit_pool, ThreadPoolExecutor(max_workers = n_stages) as executor:
 
-all_forecasts_df
+        futures = {}
+        for i, stage in enumerate(forecast_stages):
+            print(f"Forecast {i + 1}/{n_stages}: Forecasting {stage['name']}...\n")
+            futures[executor.submit(run_forecast_stage, summaries, stage, fit_pool)] = (i, stage)
 
-# 2.1 Write to Database ----
+        for future in as_completed(futures):
+
+            i, stage = futures[future]
+
+            forecast_df = future.result()
+
+            print(f"Forecast {i + 1}/{n_stages}: Forecasting {stage['name']} Complete\n")
+
+            # 2.1 Write to Database ----
+            forecast_df \
+                .write_forecast_to_database(
+                    id_column   = "id",
+                    date_column = "date",
+                    if_exists   = "upsert"
+                )
+
+    # 2.2 Evict Checkpoints ----
+    evict_forecast_checkpoints(
+        checkpoint_dir = checkpoint_kwargs['checkpoint_dir'],
+        max_age_days   = 7
+    )
 
-all_forecasts_df \
-    .write_forecast_to_database(
-        id_column   = "id",
-        date_column = "date",
-        if_exists   = "replace"
+    evict_forecaster_cache(
+        cache_dir    = checkpoint_kwargs['cache_dir'],
+        max_mb       = 500,
+        max_age_days = 30
     )
 
-print("Database update complete.")
\ No newline at end of file
+    print("Database update complete.")
\ No newline at end of file